@@ -1,13 +1,34 @@
 # -*- coding: utf-8 -*-
 """
-统一 API：get_stats
-支持增量缓存，数据未更新时直接返回缓存
+统一 API：get_stats / get_stats_batch / stream_stats
+支持增量缓存，数据未更新时直接返回缓存；结果按数据源分段缓存，某一数据源更新时只重算依赖它的段
 """
 
-from typing import Any, Dict, Optional
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from .cache import get_cached, get_data_fingerprints, set_cached
-from .stats import compute_stats
+from .cache import get_cached_sections, get_data_fingerprints, set_cached_sections
+from .loader import load_institutions, load_questionnaire, load_schools
+from .national import get_national_baseline
+from .sections import SECTION_SOURCES, SECTIONS, merge_sections, source_fingerprints
+from .stats import STREAM_DETAIL_FIELDS, compute_sections, iter_detail_rows
+from .timing import collect, span
+
+if TYPE_CHECKING:
+    from .registry import DatasetRegistry
+
+ENGINES = ("python", "pandas")
+
+
+def _stats_engine(engine: str) -> Callable[..., Dict[str, Dict[str, Any]]]:
+    """按名称取统计引擎的分段计算函数；pandas 引擎延迟导入，未安装 pandas 时才报错"""
+    if engine == "python":
+        return compute_sections
+    if engine == "pandas":
+        from .stats_pandas import compute_sections_pandas
+
+        return compute_sections_pandas
+    raise ValueError(f"未知统计引擎: {engine}，可选 {', '.join(ENGINES)}")
 
 
 def get_stats(
@@ -18,6 +39,9 @@ def get_stats(
     started_time: Optional[int] = None,
     details_limit: int = 50,
     use_cache: bool = True,
+    registry: Optional["DatasetRegistry"] = None,
+    engine: str = "python",
+    timings: bool = False,
 ) -> Dict[str, Any]:
     """
     获取统计数据与详情
@@ -29,43 +53,219 @@ def get_stats(
         education_level: 学历层次，如 高职专科 / 本科
         started_time: 调研数据开始年份
         details_limit: 详情条数上限
-        use_cache: 是否使用增量缓存
+        use_cache: 是否使用增量缓存（含全国基线缓存，见 pipeline.national）
+        registry: 数据集注册表（常驻进程使用），未命中缓存时从中取已加载数据
+        engine: 统计引擎，python（逐行）或 pandas（向量化），两者输出一致，共用缓存
+        timings: 为 True 时在 meta.timings 中返回各阶段耗时与记录数（见 pipeline.timing）
 
     返回:
         {
             "stats": {"region": {...}, "national": {...}},
             "details": {...},
-            "meta": {"from_cache": bool, "fingerprints": {...}}
+            "meta": {"from_cache": bool, "recomputed_sections": [...], "fingerprints": {...}}
         }
+        from_cache 为 True 表示全部段来自缓存；recomputed_sections 为本次重新计算的段
+        timings 为 True 时 meta 另含 "timings": [{"stage", "depth", "ms", "records"}, ...]（按开始顺序）
     """
-    cached = None
-    if use_cache:
-        cached = get_cached(school, major, region, education_level, started_time)
-        if cached is not None:
-            return {
-                **cached,
-                "meta": {
-                    "from_cache": True,
-                    "fingerprints": get_data_fingerprints(),
-                },
+    query = {
+        "school": school,
+        "major": major,
+        "region": region,
+        "education_level": education_level,
+        "started_time": started_time,
+    }
+    with (collect() if timings else nullcontext()) as collected, span("get_stats"):
+        # 同一请求内缓存查找、写入与 meta 共用一次 fingerprint
+        with span("fingerprints"):
+            fps = get_data_fingerprints()
+        cached = get_cached_sections(**query, details_limit=details_limit, fingerprints=fps) if use_cache else {}
+        load = (lambda: _registry_data(registry)) if registry is not None else dict
+        # 全国部分取自全国基线缓存，只计算区域部分
+        national = get_national_baseline().view(engine, fps) if use_cache else None
+        result = _finish(query, details_limit, cached, _stats_engine(engine), load, fps, use_cache, national)
+    if collected is not None:
+        result["meta"]["timings"] = collected.as_list()
+    return result
+
+
+def stream_stats(
+    school: Optional[str] = None,
+    major: Optional[str] = None,
+    region: Optional[str] = None,
+    education_level: Optional[str] = None,
+    started_time: Optional[int] = None,
+    details_limit: int = 50,
+    chunk_size: int = 50,
+    use_cache: bool = True,
+    registry: Optional["DatasetRegistry"] = None,
+    engine: str = "python",
+    timings: bool = False,
+) -> Tuple[Dict[str, Any], Optional[Iterator[Tuple[str, List[Dict[str, Any]]]]]]:
+    """
+    流式统计：返回 (汇总, 详情行迭代器)，参数同 get_stats，chunk_size 为每块行数
+    结果缓存全部命中时汇总即完整结果，迭代器为 None；否则汇总按 details_limit=0 计算（缓存中的有效段照常使用，
+    不写结果缓存，use_cache 时全国部分取自全国基线缓存），其中 stats.STREAM_DETAIL_FIELDS 为空列表，
+    由迭代器按 details_limit 逐块生成 (字段, 行列表)；汇总与各块拼接后同 get_stats 结果
+    """
+    query = {
+        "school": school,
+        "major": major,
+        "region": region,
+        "education_level": education_level,
+        "started_time": started_time,
+    }
+    with (collect() if timings else nullcontext()) as collected, span("get_stats"):
+        with span("fingerprints"):
+            fps = get_data_fingerprints()
+        cached = get_cached_sections(**query, details_limit=details_limit, fingerprints=fps) if use_cache else {}
+        compute = _stats_engine(engine)
+        if len(cached) == len(SECTIONS):
+            result = _finish(query, details_limit, cached, compute, dict, fps, use_cache)
+            rows = None
+        else:
+            # 汇总计算与详情生成共用同一份数据
+            data: Dict[str, Any] = {}
+
+            def load() -> Dict[str, Any]:
+                if not data:
+                    data.update(_registry_data(registry) if registry is not None else {
+                        arg: loader() for arg, loader in _SOURCE_LOADERS.values()
+                    })
+                return data
+
+            baseline = get_national_baseline()
+            partial = {
+                name: {
+                    **section,
+                    "details": {
+                        field: [] if field in STREAM_DETAIL_FIELDS else value
+                        for field, value in section["details"].items()
+                    },
+                }
+                for name, section in cached.items()
             }
+            national = baseline.view(engine, fps) if use_cache else None
+            result = _finish(query, 0, partial, compute, load, fps, False, national)
+            rows = iter_detail_rows(
+                region, major, started_time, education_level, details_limit, chunk_size,
+                load()["institutions"], load()["schools"], baseline.view("python", fps) if use_cache else None,
+            )
+    if collected is not None:
+        result["meta"]["timings"] = collected.as_list()
+    return result, rows
 
-    result = compute_stats(
-        school=school,
-        major=major,
-        region=region,
-        education_level=education_level,
-        started_time=started_time,
-        details_limit=details_limit,
-    )
+
+def _registry_data(registry: "DatasetRegistry") -> Dict[str, Any]:
+    """常驻数据集 -> compute_sections 的数据参数"""
+    data = registry.get()
+    return {
+        "institutions": data.institutions,
+        "questionnaire": data.questionnaire,
+        "schools": data.schools,
+    }
+
+
+def _finish(
+    query: Dict[str, Any],
+    details_limit: int,
+    cached: Dict[str, Dict[str, Any]],
+    compute: Callable[..., Dict[str, Dict[str, Any]]],
+    load: Callable[[], Dict[str, Any]],
+    fps: Dict[str, str],
+    use_cache: bool,
+    national: Optional[Any] = None,
+) -> Dict[str, Any]:
+    """补算缓存缺失的段（数据经 load() 取得，全部命中时不调用）、写回缓存并组装返回结构"""
+    missing = [name for name in SECTIONS if name not in cached]
+    if not missing:
+        return {
+            **merge_sections(cached),
+            "meta": {
+                "from_cache": True,
+                "recomputed_sections": [],
+                "fingerprints": source_fingerprints(fps),
+            },
+        }
+
+    extra = {"national": national} if national is not None else {}
+    with span("load"):
+        data = load()
+    with span("compute", len(missing)):
+        computed = compute(missing, details_limit=details_limit, **query, **data, **extra)
+    sections = {**cached, **computed}
 
     if use_cache:
-        set_cached(school, major, region, education_level, started_time, result)
+        set_cached_sections(**query, details_limit=details_limit, sections=sections, fingerprints=fps)
 
     return {
-        **result,
+        **merge_sections(sections),
         "meta": {
             "from_cache": False,
-            "fingerprints": get_data_fingerprints(),
+            "recomputed_sections": missing,
+            "fingerprints": source_fingerprints(fps),
         },
     }
+
+
+_QUERY_FIELDS = ("school", "major", "region", "education_level", "started_time", "details_limit")
+# 数据源 -> (compute_sections 参数名, 加载函数)
+_SOURCE_LOADERS = {
+    "institution": ("institutions", load_institutions),
+    "questionnaire": ("questionnaire", load_questionnaire),
+    "school": ("schools", load_schools),
+}
+
+
+def get_stats_batch(
+    queries: Sequence[Dict[str, Any]],
+    use_cache: bool = True,
+    registry: Optional["DatasetRegistry"] = None,
+    engine: str = "python",
+) -> List[Dict[str, Any]]:
+    """
+    批量获取统计数据：queries 为查询字典列表，键同 get_stats
+    （school / major / region / education_level / started_time / details_limit，缺省同 get_stats）
+
+    - 完全相同的查询只计算一次
+    - 缓存查找共用一次 fingerprint；有未命中时数据集只取一次（registry 或各数据源各加载一次）
+    - 与区域无关的全国部分在整批内只计算一次（学校部分按专业/年份/学历共用）
+
+    返回与 queries 等长、顺序一致的结果列表，每项结构同 get_stats，meta.from_cache 标识是否命中缓存
+    """
+    compute = _stats_engine(engine)
+    specs: List[Tuple[Any, ...]] = []
+    for q in queries:
+        unknown = set(q) - set(_QUERY_FIELDS)
+        if unknown:
+            raise ValueError(f"未知查询参数: {', '.join(sorted(unknown))}")
+        specs.append(tuple(q.get(f, 50 if f == "details_limit" else None) for f in _QUERY_FIELDS))
+
+    fps = get_data_fingerprints()
+    distinct = list(dict.fromkeys(specs))
+    cached: Dict[Tuple[Any, ...], Dict[str, Dict[str, Any]]] = {}
+    for spec in distinct:
+        query = dict(zip(_QUERY_FIELDS[:-1], spec[:-1]))
+        cached[spec] = get_cached_sections(**query, details_limit=spec[-1], fingerprints=fps) if use_cache else {}
+
+    # 只加载未命中段所依赖的数据源，整批共用
+    sources = {
+        src
+        for spec in distinct
+        for name in SECTIONS
+        if name not in cached[spec]
+        for src in SECTION_SOURCES[name]
+    }
+    data: Dict[str, Any] = {}
+    if sources:
+        if registry is not None:
+            data = _registry_data(registry)
+        else:
+            data = {arg: load() for src, (arg, load) in _SOURCE_LOADERS.items() if src in sources}
+
+    # 全国部分整批共用；use_cache 时还跨请求复用全国基线缓存
+    national: Any = get_national_baseline().view(engine, fps) if use_cache else {}
+    results: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for spec in distinct:
+        query = dict(zip(_QUERY_FIELDS[:-1], spec[:-1]))
+        results[spec] = _finish(query, spec[-1], cached[spec], compute, lambda: data, fps, use_cache, national)
+    return [results[spec] for spec in specs]
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+统计管道基准测试，结果以 JSON 输出（--output 另存文件），便于跨版本对比
+用法: python -m pipeline.bench
+     python -m pipeline.bench --region 广东省 --major 520802
+     python -m pipeline.bench --ingest-workers 1,2,4,8
+     python -m pipeline.bench --suites stats_matrix,server --output bench.json
+
+套件（--suites，默认全部）:
+    parse_counts   region + national 请求的源文件解析次数（冷/热启动）
+    cache_hit      get_stats 缓存命中耗时（fingerprint 重算 vs 记忆化）
+    ingest         学校目录并行解析（--ingest-workers）
+    stats_matrix   区域 × 专业 × 年份矩阵上 get_stats 冷（不用缓存）/热（缓存命中）耗时
+    job_demand     各区域 extract_talent_demand 耗时
+    load_schools   moe_majors 文件解析吞吐（条/秒、MB/秒）
+    cache_latency  get_stats 缓存未命中/命中耗时
+    server         进程内 ASGI 客户端并发请求 HTTP 服务的吞吐与延迟
+每个套件记录完成时的进程峰值 RSS
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from . import cache, ingest, loader, national, snapshot
+from .api import get_stats
+from .config import SCHOOL_DIR, SCHOOL_FILE_PATTERN
+from .questionnaire_extract import extract_talent_demand
+from .registry import get_registry
+from .stats import compute_stats
+from .store import ResultStore
+
+SUITES = (
+    "parse_counts",
+    "cache_hit",
+    "ingest",
+    "stats_matrix",
+    "job_demand",
+    "load_schools",
+    "cache_latency",
+    "server",
+)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程峰值常驻内存（MB）；不支持 resource 模块的平台返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+@contextmanager
+def _isolated_cache() -> Iterator[None]:
+    """使用临时结果库并清空全国基线与响应缓存，不影响正式缓存"""
+    saved_store = cache._store
+    with tempfile.TemporaryDirectory() as tmp:
+        cache._store = ResultStore(Path(tmp) / "cache.sqlite3")
+        national.get_national_baseline().clear()
+        cache.get_response_cache().clear()
+        try:
+            yield
+        finally:
+            cache._store = saved_store
+            national.get_national_baseline().clear()
+            cache.get_response_cache().clear()
+
+
+@contextmanager
+def _count_school_parses() -> Iterator[Counter]:
+    """统计期间每个 moe_majors 文件被解析的次数（期间固定单进程解析，子进程内的解析无法计数）"""
+    counts: Counter = Counter()
+    original = loader.iter_school_file
+    saved_workers = ingest.INGEST_WORKERS
+
+    def _counting(fp: Path, *args: Any):
+        counts[fp.name] += 1
+        return original(fp, *args)
+
+    loader.iter_school_file = _counting
+    snapshot.iter_school_file = _counting
+    ingest.INGEST_WORKERS = 1
+    try:
+        yield counts
+    finally:
+        loader.iter_school_file = original
+        snapshot.iter_school_file = original
+        ingest.INGEST_WORKERS = saved_workers
+
+
+@contextmanager
+def _isolated_snapshot() -> Iterator[Path]:
+    """使用临时快照路径并清空进程内学校表，模拟冷启动，不影响正式快照"""
+    saved_path, saved_table = snapshot.SCHOOL_SNAPSHOT, snapshot._table
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot.SCHOOL_SNAPSHOT = Path(tmp) / "schools.snapshot"
+        snapshot._table = None
+        try:
+            yield snapshot.SCHOOL_SNAPSHOT
+        finally:
+            snapshot.SCHOOL_SNAPSHOT, snapshot._table = saved_path, saved_table
+
+
+def bench_parse_counts(region: Optional[str] = "广东省", major: Optional[str] = None) -> Dict[str, Any]:
+    """
+    region + national 请求的源文件解析次数：冷启动（无快照）与热启动各跑一次
+    要求每个源文件至多解析一次
+    """
+    out: Dict[str, Any] = {"region": region, "major": major}
+    with _isolated_snapshot():
+        for phase in ("cold", "warm"):
+            with _count_school_parses() as counts:
+                t0 = time.perf_counter()
+                compute_stats(region=region, major=major, details_limit=0)
+                elapsed = time.perf_counter() - t0
+            out[phase] = {
+                "seconds": round(elapsed, 4),
+                "files_parsed": len(counts),
+                "total_parses": sum(counts.values()),
+                "max_parses_per_file": max(counts.values(), default=0),
+            }
+    out["ok"] = out["cold"]["max_parses_per_file"] <= 1 and out["warm"]["max_parses_per_file"] <= 1
+    return out
+
+
+def _latency_summary(samples: List[float]) -> Dict[str, float]:
+    """耗时样本（秒）汇总为微秒统计"""
+    ordered = sorted(samples)
+    n = len(ordered)
+    return {
+        "n": n,
+        "mean_us": round(sum(ordered) / n * 1e6, 1),
+        "p50_us": round(ordered[n // 2] * 1e6, 1),
+        "p99_us": round(ordered[min(n - 1, int(n * 0.99))] * 1e6, 1),
+    }
+
+
+def bench_cache_hit(
+    region: Optional[str] = "广东省", major: Optional[str] = None, n: int = 200
+) -> Dict[str, Any]:
+    """
+    get_stats 缓存命中耗时：fingerprint 每次重算（before）与记忆化（after）对比，使用临时结果库
+    """
+    service = cache._fingerprints
+    saved = service.interval
+    out: Dict[str, Any] = {"region": region, "major": major}
+    with _isolated_cache():
+        get_stats(region=region, major=major)  # 确保已缓存
+        try:
+            for label, interval in (("before", 0.0), ("after", saved)):
+                service.interval = interval
+                service.invalidate()
+                samples = []
+                for _ in range(n):
+                    t0 = time.perf_counter()
+                    r = get_stats(region=region, major=major)
+                    samples.append(time.perf_counter() - t0)
+                    assert r["meta"]["from_cache"]
+                out[label] = _latency_summary(samples)
+        finally:
+            service.interval = saved
+    return out
+
+
+def bench_ingest(
+    workers: Sequence[int] = (1, 2, 4, 8), major: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    学校目录并行解析：不同 worker 数下编译列式表（build_table）与解析+预筛选（load_schools_parallel）耗时
+    各 worker 数的结果须与单进程完全一致
+    """
+    files = sorted(SCHOOL_DIR.glob(SCHOOL_FILE_PATTERN))
+    out: Dict[str, Any] = {
+        "files": len(files),
+        "provinces": len(ingest.chunk_by_province(files)),
+        "cpu_count": os.cpu_count(),
+        "runs": [],
+    }
+    baseline = None
+    for n in workers:
+        t0 = time.perf_counter()
+        table = snapshot.build_table(files, workers=n)
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        rows = ingest.load_schools_parallel(files, workers=n, major=major, scope="national")
+        filter_s = time.perf_counter() - t0
+        key = (
+            {f: bytes(table.columns[f]) for f in table.columns},
+            table.dicts,
+            table.sources,
+            rows,
+        )
+        if baseline is None:
+            baseline = key
+        out["runs"].append(
+            {
+                "workers": n,
+                "build_table_s": round(build_s, 3),
+                "parse_filter_s": round(filter_s, 3),
+                "records": table.total,
+                "matched": len(rows),
+                "identical": key == baseline,
+            }
+        )
+    out["ok"] = all(r["identical"] for r in out["runs"])
+    return out
+
+
+def _timed(fn: Callable[[], Any]) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _opt(values: Sequence[Any]) -> List[Any]:
+    """命令行列表中的空值（'' / 'none'）表示不限"""
+    return [None if v in ("", "none", None) else v for v in values]
+
+
+def bench_stats_matrix(
+    regions: Sequence[Optional[str]] = (None, "广东省", "广州市"),
+    majors: Sequence[Optional[str]] = (None, "520802"),
+    years: Sequence[Optional[int]] = (None, 2021),
+    engine: str = "python",
+) -> Dict[str, Any]:
+    """
+    区域 × 专业 × 年份矩阵：cold 为不使用缓存的完整计算（含全国部分），warm 为缓存命中
+    数据集取自常驻注册表（加载耗时单独记录），使用临时结果库
+    """
+    registry = get_registry()
+    load_s = _timed(registry.get)
+    runs = []
+    with _isolated_cache():
+        for region in regions:
+            for major in majors:
+                for year in years:
+                    q = {"region": region, "major": major, "started_time": year}
+                    cold = _timed(lambda: get_stats(**q, use_cache=False, registry=registry, engine=engine))
+                    get_stats(**q, registry=registry, engine=engine)
+                    warm = _timed(lambda: get_stats(**q, registry=registry, engine=engine))
+                    runs.append({**q, "cold_ms": round(cold * 1000, 2), "warm_ms": round(warm * 1000, 3)})
+    return {
+        "engine": engine,
+        "dataset_load_s": round(load_s, 3),
+        "runs": runs,
+        "cold_total_ms": round(sum(r["cold_ms"] for r in runs), 2),
+        "warm_total_ms": round(sum(r["warm_ms"] for r in runs), 3),
+    }
+
+
+def bench_job_demand(regions: Sequence[Optional[str]] = (None, "广东省", "安徽省", "广州市"), n: int = 5) -> Dict[str, Any]:
+    """各区域 extract_talent_demand 耗时（问卷数据预先加载，不含缓存）"""
+    data = get_registry().get().questionnaire
+    runs = []
+    for region in regions:
+        samples = [_timed(lambda: extract_talent_demand(data=data, region=region)) for _ in range(n)]
+        runs.append({"region": region, **_latency_summary(samples)})
+    return {"rows": len(data), "runs": runs}
+
+
+def bench_load_schools() -> Dict[str, Any]:
+    """moe_majors 文件解析吞吐：整文件读入与按块流式读入（SCHOOL_READ_CHARS）"""
+    files = sorted(SCHOOL_DIR.glob(SCHOOL_FILE_PATTERN))
+    size = sum(fp.stat().st_size for fp in files)
+    out: Dict[str, Any] = {"files": len(files), "bytes": size}
+    for label, parse in (
+        ("whole_file", lambda fp: sum(1 for _ in loader.iter_school_file(fp, -1))),
+        ("chunked_64k", lambda fp: sum(1 for _ in loader.iter_school_file(fp, 64 * 1024))),
+    ):
+        t0 = time.perf_counter()
+        records = sum(parse(fp) for fp in files)
+        elapsed = time.perf_counter() - t0
+        out[label] = {
+            "records": records,
+            "seconds": round(elapsed, 3),
+            "records_per_s": round(records / elapsed) if elapsed else None,
+            "mb_per_s": round(size / 1e6 / elapsed, 2) if elapsed else None,
+        }
+    return out
+
+
+def bench_cache_latency(
+    regions: Sequence[Optional[str]] = (None, "广东省", "安徽省", "江苏省", "浙江省", "广州市"),
+    majors: Sequence[Optional[str]] = (None, "520802"),
+) -> Dict[str, Any]:
+    """get_stats 缓存未命中（首次，含全国基线建立）与命中耗时，使用临时结果库"""
+    registry = get_registry()
+    registry.get()
+    miss, hit = [], []
+    with _isolated_cache():
+        for region in regions:
+            for major in majors:
+                miss.append(_timed(lambda: get_stats(region=region, major=major, registry=registry)))
+                hit.append(_timed(lambda: get_stats(region=region, major=major, registry=registry)))
+    return {"miss": _latency_summary(miss), "hit": _latency_summary(hit)}
+
+
+def bench_server(
+    region: Optional[str] = "广东省", major: Optional[str] = None, requests: int = 200, concurrency: int = 8
+) -> Dict[str, Any]:
+    """
+    进程内 ASGI 客户端（httpx.ASGITransport）并发请求 HTTP 服务，使用临时结果库：
+    /stats 缓存命中、/stats 条件请求（304）、/job_demand 缓存命中，以及 /stats 不使用缓存
+    """
+    try:
+        import httpx
+    except ImportError:
+        return {"skipped": "请安装: pip install httpx"}
+    from .server import app
+
+    params = {k: v for k, v in {"region": region, "major": major}.items() if v is not None}
+
+    async def _run() -> Dict[str, Any]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            first = await client.get("/stats", params=params)
+            etag = first.headers.get("etag", "")
+            cases = {
+                "stats_hit": ("/stats", params, {}, requests),
+                "stats_304": ("/stats", params, {"If-None-Match": etag}, requests),
+                "job_demand_hit": ("/job_demand", {"region": region} if region else {}, {}, requests),
+                "stats_no_cache": ("/stats", {**params, "use_cache": "false"}, {}, max(1, requests // 20)),
+            }
+            out: Dict[str, Any] = {"concurrency": concurrency}
+            for name, (path, query, headers, n) in cases.items():
+                await client.get(path, params=query, headers=headers)
+                sem = asyncio.Semaphore(concurrency)
+                samples: List[float] = []
+                statuses: Counter = Counter()
+
+                async def _one() -> None:
+                    async with sem:
+                        t0 = time.perf_counter()
+                        r = await client.get(path, params=query, headers=headers)
+                        samples.append(time.perf_counter() - t0)
+                        statuses[r.status_code] += 1
+
+                t0 = time.perf_counter()
+                await asyncio.gather(*[_one() for _ in range(n)])
+                elapsed = time.perf_counter() - t0
+                out[name] = {
+                    "requests": n,
+                    "rps": round(n / elapsed, 1),
+                    "status": dict(statuses),
+                    **_latency_summary(samples),
+                }
+            return out
+
+    with _isolated_cache():
+        return asyncio.run(_run())
+
+
+def _environment() -> Dict[str, Any]:
+    """运行环境信息，便于对比不同版本/机器的结果"""
+    env: Dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    for mod in ("pandas", "orjson", "msgpack", "zstandard", "fastapi"):
+        try:
+            env[mod] = getattr(__import__(mod), "__version__", "installed")
+        except ImportError:
+            env[mod] = None
+    return env
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="统计管道基准测试")
+    parser.add_argument("--region", type=str, default="广东省", help="区域，如 广东省")
+    parser.add_argument("--major", type=str, help="专业，如 520802")
+    parser.add_argument(
+        "--ingest-workers", type=str, default="1,2,4,8", help="并行解析对比的 worker 数，逗号分隔；空串跳过"
+    )
+    parser.add_argument("--suites", type=str, default=",".join(SUITES), help=f"要运行的套件，逗号分隔：{','.join(SUITES)}")
+    parser.add_argument("--regions", type=str, default=",广东省,广州市", help="矩阵区域，逗号分隔，空项为全国")
+    parser.add_argument("--majors", type=str, default=",520802", help="矩阵专业，逗号分隔，空项为托育专业族")
+    parser.add_argument("--years", type=str, default=",2021", help="矩阵年份，逗号分隔，空项为不限")
+    parser.add_argument("--engine", choices=["python", "pandas"], default="python", help="矩阵使用的统计引擎")
+    parser.add_argument("--requests", type=int, default=200, help="server 套件每项请求数")
+    parser.add_argument("--concurrency", type=int, default=8, help="server 套件并发数")
+    parser.add_argument("--output", type=str, help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    suites = [s for s in args.suites.split(",") if s]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"未知套件: {', '.join(sorted(unknown))}")
+    regions = _opt(args.regions.split(","))
+    runners: Dict[str, Callable[[], Dict[str, Any]]] = {
+        "parse_counts": lambda: bench_parse_counts(args.region, args.major),
+        "cache_hit": lambda: bench_cache_hit(args.region, args.major),
+        "ingest": lambda: bench_ingest([int(x) for x in args.ingest_workers.split(",")], args.major),
+        "stats_matrix": lambda: bench_stats_matrix(
+            regions,
+            _opt(args.majors.split(",")),
+            [int(y) if y else None for y in args.years.split(",")],
+            args.engine,
+        ),
+        "job_demand": lambda: bench_job_demand(regions),
+        "load_schools": bench_load_schools,
+        "cache_latency": bench_cache_latency,
+        "server": lambda: bench_server(args.region, args.major, args.requests, args.concurrency),
+    }
+    if not args.ingest_workers and "ingest" in suites:
+        suites.remove("ingest")
+
+    result: Dict[str, Any] = {"environment": _environment()}
+    for name in suites:
+        t0 = time.perf_counter()
+        result[name] = runners[name]()
+        result[name]["suite_seconds"] = round(time.perf_counter() - t0, 3)
+        result[name]["peak_rss_mb"] = peak_rss_mb()
+        print(f"# {name} 完成，{result[name]['suite_seconds']:.2f}s", file=sys.stderr)
+    result["peak_rss_mb"] = peak_rss_mb()
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    print(text)
+    ok = result.get("parse_counts", {}).get("ok", True) and result.get("ingest", {}).get("ok", True)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,89 +1,202 @@
 # -*- coding: utf-8 -*-
 """
 增量缓存：基于数据源 fingerprint，数据未更新时直接返回缓存
+结果按查询键逐条存入 SQLite（见 pipeline.store），条目内按结果段分别记录所依赖数据源的 fingerprint
 """
 
 import hashlib
-import json
-import os
-from pathlib import Path
-from typing import Any, Dict, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
 
-from .config import CACHE_DIR, INSTITUTION_JSON, QUESTIONNAIRE_XLSX, SCHOOL_DIR, SCHOOL_FILE_PATTERN
+from .config import (
+    CACHE_DIR,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL_SECONDS,
+    FINGERPRINT_REVALIDATE_SECONDS,
+    INSTITUTION_JSON,
+    QUESTIONNAIRE_XLSX,
+    RESPONSE_CACHE_MAX_BYTES,
+    SCHOOL_DIR,
+    SCHOOL_FILE_PATTERN,
+)
+from .fingerprint import file_fingerprint
+from .loader import school_file_province
+from .sections import (
+    SCHOOL_PROVINCE_PREFIX,
+    SECTION_SOURCES,
+    SECTIONS,
+    merge_sections,
+    section_fingerprints,
+    split_result,
+)
+from .store import ResultStore
+from .timing import span
 
-CACHE_DB = "cache.json"
-FINGERPRINT_DB = "fingerprints.json"
+CACHE_DB = "cache.sqlite3"
+LEGACY_CACHE_DB = "cache.json"  # 旧版单文件缓存，clear_cache 时一并删除
 
 
-def _file_fingerprint(path: Path) -> str:
-    """单文件 fingerprint = path + mtime + size"""
-    if not path.exists():
-        return ""
-    st = path.stat()
-    s = f"{path!s}|{st.st_mtime}|{st.st_size}"
-    return hashlib.sha256(s.encode()).hexdigest()
-
-
-def get_data_fingerprints() -> Dict[str, str]:
+def _compute_fingerprints() -> Dict[str, str]:
     """
-    获取各数据源当前 fingerprint
-    数据更新（文件变更）时 fingerprint 变化，需重新统计
+    逐文件 stat 计算各数据源 fingerprint
+    学校另按文件名中的省份给出 school:{省份}，供学校段区域部分按省份失效（见 pipeline.sections）
     """
     fps: Dict[str, str] = {}
 
     if INSTITUTION_JSON.exists():
-        fps["institution"] = _file_fingerprint(INSTITUTION_JSON)
+        fps["institution"] = file_fingerprint(INSTITUTION_JSON)
     else:
         fps["institution"] = ""
 
     if QUESTIONNAIRE_XLSX.exists():
-        fps["questionnaire"] = _file_fingerprint(QUESTIONNAIRE_XLSX)
+        fps["questionnaire"] = file_fingerprint(QUESTIONNAIRE_XLSX)
     else:
         fps["questionnaire"] = ""
 
     if SCHOOL_DIR.exists():
         parts = []
+        by_province: Dict[str, List[str]] = {}
         for f in sorted(SCHOOL_DIR.glob(SCHOOL_FILE_PATTERN)):
-            parts.append(_file_fingerprint(f))
+            fp = file_fingerprint(f)
+            parts.append(fp)
+            by_province.setdefault(school_file_province(f.name), []).append(fp)
         fps["school"] = hashlib.sha256("|".join(parts).encode()).hexdigest() if parts else ""
+        for province, province_parts in by_province.items():
+            fps[SCHOOL_PROVINCE_PREFIX + province] = hashlib.sha256("|".join(province_parts).encode()).hexdigest()
     else:
         fps["school"] = ""
 
     return fps
 
 
+class FingerprintService:
+    """
+    fingerprint 记忆化：在重验间隔内复用上次结果，避免每次查询 stat 全部学校文件
+    interval: 重验间隔（秒），0 表示每次重新计算
+    """
+
+    def __init__(self, interval: float = FINGERPRINT_REVALIDATE_SECONDS) -> None:
+        self.interval = interval
+        self._value: Optional[Dict[str, str]] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, max_age: Optional[float] = None) -> Dict[str, str]:
+        """返回当前 fingerprint；距上次计算超过 max_age（默认 interval）秒时重新计算"""
+        max_age = self.interval if max_age is None else max_age
+        with self._lock:
+            if self._value is not None and time.monotonic() - self._checked_at < max_age:
+                return dict(self._value)
+        fps = _compute_fingerprints()
+        with self._lock:
+            self._value = fps
+            self._checked_at = time.monotonic()
+        return dict(fps)
+
+    def invalidate(self) -> None:
+        """丢弃记忆值（如刚写入数据文件），下次 get() 重新计算"""
+        with self._lock:
+            self._value = None
+
+
+_fingerprints = FingerprintService()
+
+
+def get_data_fingerprints(max_age: Optional[float] = None) -> Dict[str, str]:
+    """
+    获取各数据源当前 fingerprint
+    数据更新（文件变更）时 fingerprint 变化，需重新统计
+    结果在 FINGERPRINT_REVALIDATE_SECONDS 内复用；max_age=0 强制重新计算
+    """
+    return _fingerprints.get(max_age)
+
+
 def _query_key(school: Optional[str], major: Optional[str], region: Optional[str], 
-               education_level: Optional[str], started_time: Optional[int]) -> str:
-    """生成查询缓存键"""
+               education_level: Optional[str], started_time: Optional[int], details_limit: int) -> str:
+    """生成查询缓存键（详情条数不同的查询分别缓存）"""
     parts = [
         school or "",
         major or "",
         region or "",
         education_level or "",
         str(started_time) if started_time is not None else "",
+        str(details_limit),
     ]
     s = "|".join(parts)
     return hashlib.sha256(s.encode()).hexdigest()
 
 
-def _load_cache() -> Dict[str, Any]:
-    """加载缓存文件"""
-    cache_path = CACHE_DIR / CACHE_DB
-    if not cache_path.exists():
-        return {}
-    try:
-        with open(cache_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+_store: Optional[ResultStore] = None
+
+
+def get_store() -> ResultStore:
+    """进程级结果存储（SQLite，一条查询一行）"""
+    global _store
+    if _store is None:
+        _store = ResultStore(CACHE_DIR / CACHE_DB, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS)
+    return _store
+
+
+def get_cached_sections(
+    school: Optional[str],
+    major: Optional[str],
+    region: Optional[str],
+    education_level: Optional[str],
+    started_time: Optional[int],
+    details_limit: int,
+    fingerprints: Optional[Dict[str, str]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    返回仍然有效的结果段 {段: 段内容}：段（在该区域下）所依赖数据源的 fingerprint 与当前一致（见 pipeline.sections）
+    fingerprints: 调用方已取得的 fingerprint，None 时自动获取
+    """
+    key = _query_key(school, major, region, education_level, started_time, details_limit)
+    current_fps = get_data_fingerprints() if fingerprints is None else fingerprints
+    with span("cache.get") as s:
+        entry = get_store().get(key)
+        valid: Dict[str, Dict[str, Any]] = {}
+        for name, section in ((entry or {}).get("sections") or {}).items():
+            if name in SECTION_SOURCES and section.get("fingerprints") == section_fingerprints(name, current_fps, region):
+                valid[name] = section["data"]
+        s.records = len(valid)
+    return valid
 
 
-def _save_cache(data: Dict[str, Any]) -> None:
-    """保存缓存文件"""
-    CACHE_DIR.mkdir(parents=True, exist_ok=True)
-    cache_path = CACHE_DIR / CACHE_DB
-    with open(cache_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def set_cached_sections(
+    school: Optional[str],
+    major: Optional[str],
+    region: Optional[str],
+    education_level: Optional[str],
+    started_time: Optional[int],
+    details_limit: int,
+    sections: Dict[str, Dict[str, Any]],
+    ttl: Optional[float] = None,
+    fingerprints: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    写入结果段，每段记录其所依赖数据源的 fingerprint；ttl 为该条目过期秒数（None 使用 CACHE_TTL_SECONDS）
+    fingerprints: 计算结果所依据的 fingerprint，None 时自动获取
+    """
+    key = _query_key(school, major, region, education_level, started_time, details_limit)
+    current_fps = get_data_fingerprints() if fingerprints is None else fingerprints
+    store_region = (region or "").strip()
+    with span("cache.put", len(sections)):
+        get_store().put(key, {
+            "sections": {
+                name: {"fingerprints": section_fingerprints(name, current_fps, region), "data": data}
+                for name, data in sections.items()
+            },
+            "query": {
+                "school": school,
+                "major": major,
+                "region": region,
+                "education_level": education_level,
+                "started_time": started_time,
+                "details_limit": details_limit,
+            },
+        }, ttl=ttl, region=store_region)
 
 
 def get_cached(
@@ -92,20 +205,19 @@ def get_cached(
     region: Optional[str],
     education_level: Optional[str],
     started_time: Optional[int],
+    details_limit: int = 50,
+    fingerprints: Optional[Dict[str, str]] = None,
 ) -> Optional[Dict[str, Any]]:
     """
-    若当前数据 fingerprint 与缓存一致，返回缓存结果；否则返回 None
+    全部结果段均有效时返回完整缓存结果；否则返回 None
+    fingerprints: 调用方已取得的 fingerprint，None 时自动获取
     """
-    key = _query_key(school, major, region, education_level, started_time)
-    current_fps = get_data_fingerprints()
-    cache = _load_cache()
-    entry = cache.get(key)
-    if not entry:
-        return None
-    cached_fps = entry.get("fingerprints", {})
-    if cached_fps != current_fps:
+    sections = get_cached_sections(
+        school, major, region, education_level, started_time, details_limit, fingerprints
+    )
+    if any(name not in sections for name in SECTIONS):
         return None
-    return entry.get("result")
+    return merge_sections(sections)
 
 
 def set_cached(
@@ -115,27 +227,133 @@ def set_cached(
     education_level: Optional[str],
     started_time: Optional[int],
     result: Dict[str, Any],
+    details_limit: int = 50,
+    ttl: Optional[float] = None,
+    fingerprints: Optional[Dict[str, str]] = None,
 ) -> None:
-    """写入缓存"""
-    key = _query_key(school, major, region, education_level, started_time)
-    current_fps = get_data_fingerprints()
-    cache = _load_cache()
-    cache[key] = {
-        "fingerprints": current_fps,
-        "result": result,
-        "query": {
-            "school": school,
-            "major": major,
-            "region": region,
-            "education_level": education_level,
-            "started_time": started_time,
-        },
-    }
-    _save_cache(cache)
+    """写入完整结果（按段拆分存储），参数同 set_cached_sections"""
+    set_cached_sections(
+        school, major, region, education_level, started_time, details_limit, split_result(result), ttl, fingerprints
+    )
+
+
+class SingleFlight:
+    """
+    同键请求合并：同一键的并发调用只执行一次 fn，其余调用等待并共享其结果（或异常）
+    结果对象在等待者之间共享，调用方不应原地修改
+    """
+
+    class _Call:
+        __slots__ = ("done", "result", "error")
+
+        def __init__(self) -> None:
+            self.done = threading.Event()
+            self.result: Any = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, "SingleFlight._Call"] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class ResponseCache:
+    """
+    已序列化响应缓存（进程内 LRU，按字节数限额）：命中时直接返回存储的 JSON 字节，不再解码、重新编码
+    条目按 (键, 所依赖数据源 fingerprint) 存取，fingerprint 变化即视为未命中
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[str, ...], bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, fingerprints: Tuple[str, ...]) -> Optional[bytes]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[0] != fingerprints:
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def put(self, key: Hashable, fingerprints: Tuple[str, ...], body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (fingerprints, body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._bytes -= len(dropped)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_responses = ResponseCache()
+
+
+def get_response_cache() -> ResponseCache:
+    """进程级已序列化响应缓存"""
+    return _responses
+
+
+def invalidate_regions(provinces: Iterable[str]) -> int:
+    """
+    学校数据按省份增量更新后调用：从区域为 provinces 或全国的缓存条目中移除学校段（区域部分与详情），
+    机构、问卷星、交叉验证与学校全国段保留，返回修改的条目数
+    学校段按省份 fingerprint 校验，不调用也不会返回过期结果；调用只是及早释放过期的学校详情
+    """
+    store = get_store()
+    changed = 0
+    for key, region in store.keys_in_regions(set(provinces) | {""}):
+        entry = store.get(key)
+        if not entry or "school" not in (entry.get("sections") or {}):
+            continue
+        sections = {name: s for name, s in entry["sections"].items() if name != "school"}
+        store.put(key, {**entry, "sections": sections}, region=region)
+        changed += 1
+    return changed
 
 
 def clear_cache() -> None:
     """清空缓存（数据批量更新后可选调用）"""
-    cache_path = CACHE_DIR / CACHE_DB
-    if cache_path.exists():
-        cache_path.unlink()
+    get_store().clear()
+    _responses.clear()
+    legacy = CACHE_DIR / LEGACY_CACHE_DB
+    if legacy.exists():
+        legacy.unlink()
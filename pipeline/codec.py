@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+缓存条目二进制编码：2 字节头（序列化格式 + 压缩方式）+ 负载
+序列化优先 msgpack（未安装时为紧凑 JSON），超过阈值的负载按 zstd（未安装时为 zlib）压缩；
+解码按头部识别，不同配置写入的条目可混合读取
+"""
+
+import json
+import zlib
+from typing import Any, Optional, Tuple
+
+from .config import CACHE_COMPRESSION, CACHE_SERIALIZER
+
+# 头部：序列化格式
+_JSON = b"j"
+_MSGPACK = b"m"
+# 头部：压缩方式
+_RAW = b"n"
+_ZLIB = b"z"
+_ZSTD = b"s"
+
+# 小于该字节数的负载不压缩
+_COMPRESS_MIN_BYTES = 256
+_ZLIB_LEVEL = 6
+_ZSTD_LEVEL = 3
+
+
+class DecodeError(ValueError):
+    """缓存条目无法解码：格式无法识别、所需库未安装，或数据损坏/截断"""
+
+
+def _msgpack() -> Any:
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def _zstd() -> Any:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def resolve_format(
+    serializer: Optional[str] = None, compression: Optional[str] = None
+) -> Tuple[bytes, bytes]:
+    """
+    解析配置为 (序列化头, 压缩头)
+    serializer: auto / msgpack / json；compression: auto / zstd / zlib / none（None 使用 config 中的值）
+    auto 时按可用性依次选择；显式指定但未安装时报错
+    """
+    serializer = serializer or CACHE_SERIALIZER
+    compression = compression or CACHE_COMPRESSION
+    if serializer == "auto":
+        ser = _MSGPACK if _msgpack() is not None else _JSON
+    elif serializer == "msgpack":
+        if _msgpack() is None:
+            raise ImportError("请安装: pip install msgpack")
+        ser = _MSGPACK
+    elif serializer == "json":
+        ser = _JSON
+    else:
+        raise ValueError(f"未知缓存序列化格式: {serializer}")
+
+    if compression == "auto":
+        comp = _ZSTD if _zstd() is not None else _ZLIB
+    elif compression == "zstd":
+        if _zstd() is None:
+            raise ImportError("请安装: pip install zstandard")
+        comp = _ZSTD
+    elif compression == "zlib":
+        comp = _ZLIB
+    elif compression == "none":
+        comp = _RAW
+    else:
+        raise ValueError(f"未知缓存压缩方式: {compression}")
+    return ser, comp
+
+
+def encode(value: Any, fmt: Optional[Tuple[bytes, bytes]] = None) -> bytes:
+    """值 -> 带头部的字节串"""
+    ser, comp = fmt or resolve_format()
+    if ser == _MSGPACK:
+        payload = _msgpack().packb(value, use_bin_type=True)
+    else:
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(payload) < _COMPRESS_MIN_BYTES or comp == _RAW:
+        return ser + _RAW + payload
+    if comp == _ZSTD:
+        return ser + _ZSTD + _zstd().ZstdCompressor(level=_ZSTD_LEVEL).compress(payload)
+    return ser + _ZLIB + zlib.compress(payload, _ZLIB_LEVEL)
+
+
+def decode(data: Any) -> Any:
+    """
+    字节串 -> 值；兼容旧版按 JSON 文本存储的条目
+    格式无法识别、所需库未安装或数据损坏（解压、反序列化失败）时抛出 DecodeError
+    """
+    try:
+        return _decode(data)
+    except DecodeError:
+        raise
+    except Exception as e:  # zlib.error、zstd / msgpack 解码异常、JSON 与 UTF-8 解码错误等
+        raise DecodeError(f"缓存条目解码失败: {e!r}") from e
+
+
+def _decode(data: Any) -> Any:
+    if isinstance(data, str):
+        return json.loads(data)
+    data = bytes(data)
+    ser, comp, payload = data[:1], data[1:2], data[2:]
+    if comp == _ZLIB:
+        payload = zlib.decompress(payload)
+    elif comp == _ZSTD:
+        zstd = _zstd()
+        if zstd is None:
+            raise DecodeError("缓存条目为 zstd 压缩，但未安装 zstandard")
+        payload = zstd.ZstdDecompressor().decompress(payload)
+    elif comp != _RAW:
+        raise DecodeError("未知缓存条目压缩方式")
+    if ser == _MSGPACK:
+        msgpack = _msgpack()
+        if msgpack is None:
+            raise DecodeError("缓存条目为 msgpack 格式，但未安装 msgpack")
+        return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+    if ser == _JSON:
+        return json.loads(payload)
+    raise DecodeError("未知缓存条目序列化格式")
@@ -13,6 +13,45 @@ QUESTIONNAIRE_XLSX = DB_DIR / "问卷星统计_托育机构人才需求专项调
 SCHOOL_DIR = DB_DIR / "托育学校注册备案数据"
 CACHE_DIR = DB_DIR / "_stats_cache"
 MANIFEST_DIR = DB_DIR / "_manifest"
+# 统计结果缓存：条目数上限（按最近访问淘汰）与过期秒数（None 为不过期，依赖 fingerprint 失效）
+CACHE_MAX_ENTRIES = 50000
+CACHE_TTL_SECONDS = None
+# 缓存条目编码：序列化 auto / msgpack / json，压缩 auto / zstd / zlib / none（auto 按已安装的库选择）
+CACHE_SERIALIZER = "auto"
+CACHE_COMPRESSION = "auto"
+# 全国基线（统计结果 national 部分）进程内缓存条目数上限
+NATIONAL_CACHE_MAX_ENTRIES = 256
+# HTTP 服务已序列化响应的进程内缓存上限（字节）
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# GET /stats、/job_demand 的 Cache-Control max-age（秒），供反向代理与客户端缓存；数据更新后 ETag 随 fingerprint 变化
+HTTP_CACHE_MAX_AGE = 60
+# /metrics 阶段耗时直方图桶上界（秒）
+METRICS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 数据源 fingerprint 重验间隔（秒）：间隔内复用上次结果，数据上传后最多延迟该时长生效
+FINGERPRINT_REVALIDATE_SECONDS = 2.0
+# 学校数据列式快照（python -m pipeline.snapshot_main 编译）
+SCHOOL_SNAPSHOT = CACHE_DIR / "schools.snapshot"
+# 问卷星工作簿解析结果的列式缓存（按工作簿 fingerprint 失效）
+QUESTIONNAIRE_CACHE = CACHE_DIR / "questionnaire.pkl"
+# 学校目录并行解析进程数（None 为 CPU 核数，1 为单进程）
+INGEST_WORKERS = None
+# HTTP 服务统计计算线程池：线程数（None 为 min(4, CPU 核数)）、排队上限（超出返回 503 + Retry-After）、
+# 单请求截止秒数（超出返回 504，None 不限）与建议重试间隔
+COMPUTE_WORKERS = None
+COMPUTE_MAX_PENDING = 32
+COMPUTE_DEADLINE_SECONDS = 60.0
+COMPUTE_RETRY_AFTER_SECONDS = 5
+# 缓存预热（python -m pipeline.warm / 服务启动）：专业与学历层次列表（None 为不限，专业不限即托育专业族）、
+# 统计详情与人才需求 raw_sample 条数（与接口默认值一致）、并行线程数（None 为 min(4, CPU 核数)）
+WARM_MAJORS = (None, "520802")
+WARM_EDUCATION_LEVELS = (None,)
+WARM_DETAILS_LIMIT = 50
+WARM_JOB_DEMAND_DETAILS_LIMIT = 10
+WARM_WORKERS = None
+# 服务启动时是否在后台预热（默认关闭：全国 × 省份 × 城市 × 专业全量预热占用 CPU，与计算线程池竞争，
+# 且只写结果缓存、不填已序列化响应缓存），及之后检查数据更新并重新预热的间隔（秒，None 只在启动时预热）
+WARM_ON_STARTUP = False
+WARM_WATCH_SECONDS = 30.0
 
 # 托育相关专业代码（用于学校筛选）
 # 520802=婴幼儿托育服务与管理, 570101K=早期教育, 660225=早期教育(部分目录)
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+学校聚合立方体：按 (开设专业, 省份, 年份, 修业年限) 预聚合计数，每个单元保存有序记录下标
+单元按专业编码排序，专业筛选后只遍历命中专业的单元，计数与分布无需访问原始记录
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+# 单元键字段顺序（首字段用于二分定位）
+CUBE_FIELDS = ("开设专业", "省份", "年份", "修业年限")
+# 快照中的列名
+CUBE_ARRAYS = ("cube.rows", "cube.start") + tuple(f"cube.{f}" for f in CUBE_FIELDS)
+
+
+class SchoolCube:
+    """
+    rows: 按单元键排序后的记录下标（单元内保持原顺序）
+    start: 单元 c 的记录为 rows[start[c]:start[c + 1]]
+    keys: {字段: 每个单元在该字段上的编码}
+    """
+
+    def __init__(self, rows: Sequence[int], start: Sequence[int], keys: Dict[str, Sequence[int]]) -> None:
+        self.rows = rows
+        self.start = start
+        self.keys = keys
+
+    @property
+    def cell_count(self) -> int:
+        return len(self.start) - 1
+
+    def cells(self, conditions: Dict[str, Optional[Set[int]]]) -> List[int]:
+        """满足条件的单元下标；conditions 同 SchoolTable.scan，None 表示不限"""
+        first = CUBE_FIELDS[0]
+        lead = conditions.get(first)
+        col = self.keys[first]
+        if lead is None:
+            candidates: Iterable[int] = range(self.cell_count)
+        else:
+            candidates = [
+                c
+                for code in sorted(lead)
+                for c in range(bisect_left(col, code), bisect_right(col, code))
+            ]
+        checks = [(self.keys[f], conditions[f]) for f in CUBE_FIELDS[1:] if conditions.get(f) is not None]
+        out = []
+        for c in candidates:
+            for keys, ok in checks:
+                if keys[c] not in ok:
+                    break
+            else:
+                out.append(c)
+        return out
+
+    def size(self, cell: int) -> int:
+        return self.start[cell + 1] - self.start[cell]
+
+    def count(self, cells: Iterable[int]) -> int:
+        return sum(self.size(c) for c in cells)
+
+    def row_ids(self, cells: Iterable[int]) -> List[int]:
+        """单元内记录下标合并后按原顺序排序"""
+        ids: List[int] = []
+        for c in cells:
+            ids.extend(self.rows[self.start[c] : self.start[c + 1]])
+        ids.sort()
+        return ids
+
+    def first_row(self, cell: int) -> int:
+        return self.rows[self.start[cell]]
+
+
+def build_cube(columns: Dict[str, Sequence[int]]) -> SchoolCube:
+    """按单元键稳定排序全部记录，生成立方体数组"""
+    keycols = [columns[f] for f in CUBE_FIELDS]
+    n = len(keycols[0])
+    keys_by_row = list(zip(*keycols))
+    order = sorted(range(n), key=keys_by_row.__getitem__)
+
+    rows = array("i", order)
+    start = array("i")
+    keys: Dict[str, array] = {f: array("i") for f in CUBE_FIELDS}
+    prev = None
+    for pos, i in enumerate(order):
+        key = keys_by_row[i]
+        if key != prev:
+            start.append(pos)
+            for f, v in zip(CUBE_FIELDS, key):
+                keys[f].append(v)
+            prev = key
+    start.append(n)
+    return SchoolCube(rows, start, keys)
+
+
+def cube_arrays(cube: SchoolCube) -> Dict[str, Sequence[int]]:
+    """立方体 -> 快照列"""
+    arrays: Dict[str, Sequence[int]] = {"cube.rows": cube.rows, "cube.start": cube.start}
+    for f in CUBE_FIELDS:
+        arrays[f"cube.{f}"] = cube.keys[f]
+    return arrays
+
+
+def cube_from_arrays(arrays: Dict[str, Sequence[int]]) -> SchoolCube:
+    """快照列 -> 立方体"""
+    return SchoolCube(
+        arrays["cube.rows"],
+        arrays["cube.start"],
+        {f: arrays[f"cube.{f}"] for f in CUBE_FIELDS},
+    )
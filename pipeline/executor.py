@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+统计计算执行器：HTTP 服务把 get_stats / get_talent_demand 交给专用的有界线程池执行，
+排队数超过上限时立即拒绝（准入控制），单个请求等待超过截止时间时返回超时，
+避免少数全国统计请求占满 Starlette 默认线程池、拖慢轻量请求
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from .config import (
+    COMPUTE_DEADLINE_SECONDS,
+    COMPUTE_MAX_PENDING,
+    COMPUTE_RETRY_AFTER_SECONDS,
+    COMPUTE_WORKERS,
+)
+
+
+class Overloaded(Exception):
+    """排队（执行中 + 等待中）数已达上限"""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"计算队列已满，请 {retry_after:g} 秒后重试")
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """超过单请求截止时间（计算仍在后台完成并写入缓存）"""
+
+    def __init__(self, deadline: float) -> None:
+        super().__init__(f"计算超过截止时间 {deadline:g} 秒")
+        self.deadline = deadline
+
+
+class ComputeExecutor:
+    """
+    有界计算执行器
+    workers: 计算线程数（None 为 min(4, CPU 核数)）
+    max_pending: 执行中 + 等待中的任务上限，超出时 submit 抛出 Overloaded
+    deadline: 默认单请求截止秒数；None 不限
+    retry_after: 拒绝时建议的重试间隔（秒）
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = COMPUTE_WORKERS,
+        max_pending: int = COMPUTE_MAX_PENDING,
+        deadline: Optional[float] = COMPUTE_DEADLINE_SECONDS,
+        retry_after: float = COMPUTE_RETRY_AFTER_SECONDS,
+    ) -> None:
+        self.workers = max(1, int(workers or min(4, os.cpu_count() or 1)))
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.retry_after = retry_after
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="compute")
+            return self._pool
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise Overloaded(self.retry_after)
+            self._pending += 1
+
+    def _release(self, _future: Any) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def _wait(self, future: "Future[Any]", deadline: Optional[float]) -> Any:
+        deadline = self.deadline if deadline is None else deadline
+        wrapped = asyncio.wrap_future(future)
+        if deadline is None:
+            return await wrapped
+        try:
+            return await asyncio.wait_for(asyncio.shield(wrapped), timeout=deadline)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._timed_out += 1
+            raise DeadlineExceeded(deadline) from None
+
+    async def run(self, fn: Callable[..., Any], *args: Any, deadline: Optional[float] = None, **kwargs: Any) -> Any:
+        """
+        在计算线程池中执行 fn(*args, **kwargs) 并等待结果
+        队列已满抛出 Overloaded；超过 deadline（默认 self.deadline）抛出 DeadlineExceeded，
+        此时任务不会被中断，完成后照常释放名额
+        """
+        self._acquire()
+        try:
+            future = self._get_pool().submit(partial(fn, *args, **kwargs))
+        except BaseException:
+            self._release(None)
+            raise
+        # 名额在线程任务真正结束时释放，而不是在等待方超时返回时
+        future.add_done_callback(self._release)
+        return await self._wait(future, deadline)
+
+    def hold(self) -> "ComputeSlot":
+        """占用一个排队名额直到 ComputeSlot.release()（如流式响应的整个输出期间），队列已满抛出 Overloaded"""
+        self._acquire()
+        return ComputeSlot(self)
+
+    def stats(self) -> dict:
+        """当前排队数与累计拒绝/超时次数"""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+class ComputeSlot:
+    """
+    ComputeExecutor.hold() 占用的排队名额：持有期间各步计算经 run() 在计算线程池中依次执行，不再另占名额，
+    每步受截止时间约束；release() 在最后一步线程任务结束后归还名额（可重复调用）
+    """
+
+    def __init__(self, executor: ComputeExecutor) -> None:
+        self._executor = executor
+        self._future: Optional["Future[Any]"] = None
+        self._released = False
+
+    async def run(self, fn: Callable[..., Any], *args: Any, deadline: Optional[float] = None, **kwargs: Any) -> Any:
+        """在计算线程池中执行 fn(*args, **kwargs) 并等待结果，超过 deadline 抛出 DeadlineExceeded"""
+        self._future = self._executor._get_pool().submit(partial(fn, *args, **kwargs))
+        return await self._executor._wait(self._future, deadline)
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        if self._future is None:
+            self._executor._release(None)
+        else:
+            # 已结束时立即回调；超时后仍在执行的一步结束时才归还
+            self._future.add_done_callback(self._executor._release)
+
+
+_executor: Optional[ComputeExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ComputeExecutor:
+    """进程级计算执行器"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ComputeExecutor()
+        return _executor
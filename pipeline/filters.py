@@ -3,13 +3,16 @@
 筛选逻辑：按区域、专业、年份等条件过滤
 """
 
-import re
-from typing import Any, Dict, List, Optional, Set, Tuple
+import fnmatch
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
 from .config import TUOYU_MAJOR_CODES, TUOYU_MAJOR_NAMES
-from .loader import parse_zoning
+from .loader import institution_zoning, parse_major
+from .snapshot import SchoolTable
+from .timing import timed
 
 
+@timed("filter.institutions")
 def filter_institutions(
     data: List[Dict[str, Any]],
     region: Optional[str] = None,
@@ -28,12 +31,17 @@ def filter_institutions(
     result = []
     for item in data:
         zoning = item.get("zoning_name") or ""
-        prov, city = parse_zoning(zoning)
-        if region in (prov, city, zoning) or zoning.startswith(region):
+        prov, city = institution_zoning(item)
+        if institution_in_region(region, zoning, prov, city):
             result.append(item)
     return result
 
 
+def institution_in_region(region: str, zoning: str, prov: str, city: str) -> bool:
+    """机构区划是否落在 region（省名、市名或区划前缀）内，region 需已 strip"""
+    return region in (prov, city, zoning) or zoning.startswith(region)
+
+
 def _match_major(开设专业: str, major: Optional[str], major_codes: Tuple[str, ...], major_names: Tuple[str, ...]) -> bool:
     """判断专业是否匹配（托育相关或指定 major）"""
     if not 开设专业:
@@ -42,10 +50,7 @@ def _match_major(开设专业: str, major: Optional[str], major_codes: Tuple[str
     if major:
         if major in 开设专业:
             return True
-        code_match = re.search(r"\((\d+[K]?)\)", 开设专业)
-        if code_match and major == code_match.group(1):
-            return True
-        return False
+        return major == parse_major(开设专业)[1]
     # 未指定 major 时，匹配托育相关专业
     for code in major_codes:
         if code in 开设专业:
@@ -56,8 +61,31 @@ def _match_major(开设专业: str, major: Optional[str], major_codes: Tuple[str
     return False
 
 
+def _year_ok(年份: Any, year_from: Optional[int]) -> bool:
+    """年份下限判断，非数字年份不参与筛选（保留）"""
+    try:
+        y = int(年份)
+        if year_from is not None and y < year_from:
+            return False
+    except (ValueError, TypeError):
+        pass
+    return True
+
+
+def _education_ok(修业年限: Any, education_level: Optional[str]) -> bool:
+    """按修业年限推断学历层次：本科 4/5 年，专科 2/3 年"""
+    if not education_level:
+        return True
+    years = str(修业年限)
+    if "本科" in education_level and years not in ("4", "5"):
+        return False
+    if "专科" in education_level and years not in ("2", "3"):
+        return False
+    return True
+
+
 def filter_schools(
-    data: List[Dict[str, Any]],
+    data: Iterable[Dict[str, Any]],
     region: Optional[str] = None,
     major: Optional[str] = None,
     year_from: Optional[int] = None,
@@ -73,31 +101,122 @@ def filter_schools(
     year_from: 年份下限
     education_level: 高职专科/本科等，通过修业年限推断
     scope: region / national
+    data 为列式快照（SchoolTable）时按列编码筛选，仅物化命中记录；
+    为记录迭代器（如 loader.iter_schools）时边读取边筛选，只保留命中记录
+    """
+    return list(
+        iter_filter_schools(data, region, major, year_from, education_level, scope, major_codes, major_names)
+    )
+
+
+def iter_filter_schools(
+    data: Iterable[Dict[str, Any]],
+    region: Optional[str] = None,
+    major: Optional[str] = None,
+    year_from: Optional[int] = None,
+    education_level: Optional[str] = None,
+    scope: str = "region",
+    major_codes: Optional[Tuple[str, ...]] = None,
+    major_names: Optional[Tuple[str, ...]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    filter_schools 的生成器版本，可直接串接 loader.iter_schools 流式筛选：
+    内存占用只取决于调用方保留的命中记录
     """
     major_codes = major_codes or TUOYU_MAJOR_CODES
     major_names = major_names or TUOYU_MAJOR_NAMES
 
-    result = []
+    if isinstance(data, SchoolTable):
+        yield from _filter_school_table(
+            data, region, major, year_from, education_level, scope, major_codes, major_names
+        )
+        return
+
     for item in data:
         if scope == "region" and region:
             if item.get("省份") != region:
                 continue
         if not _match_major(item.get("开设专业", ""), major, major_codes, major_names):
             continue
-        try:
-            y = int(item.get("年份", 0))
-            if year_from is not None and y < year_from:
-                continue
-        except (ValueError, TypeError):
-            pass
-        if education_level:
-            years = item.get("修业年限", "")
-            if "本科" in education_level and str(years) not in ("4", "5"):
-                continue
-            if "专科" in education_level and str(years) not in ("2", "3"):
-                continue
-        result.append(item)
-    return result
+        if not _year_ok(item.get("年份", 0), year_from):
+            continue
+        if not _education_ok(item.get("修业年限", ""), education_level):
+            continue
+        yield item
+
+
+def school_conditions(
+    table: SchoolTable,
+    region: Optional[str],
+    major: Optional[str],
+    year_from: Optional[int],
+    education_level: Optional[str],
+    scope: str = "region",
+    major_codes: Optional[Tuple[str, ...]] = None,
+    major_names: Optional[Tuple[str, ...]] = None,
+) -> Dict[str, Optional[Set[int]]]:
+    """将筛选条件转换为各列允许的编码集合：谓词只在各列去重取值上求值一次"""
+    major_codes = major_codes or TUOYU_MAJOR_CODES
+    major_names = major_names or TUOYU_MAJOR_NAMES
+    conditions: Dict[str, Optional[Set[int]]] = {
+        "开设专业": table.major_index.match(major, major_codes, major_names),
+    }
+    if scope == "region" and region:
+        conditions["省份"] = table.codes_where("省份", lambda v: v == region)
+    if year_from is not None:
+        conditions["年份"] = table.codes_where(
+            "年份", lambda v: _year_ok(0 if v is None else v, year_from)
+        )
+    if education_level:
+        conditions["修业年限"] = table.codes_where(
+            "修业年限", lambda v: _education_ok("" if v is None else v, education_level)
+        )
+    return conditions
+
+
+def _filter_school_table(
+    table: SchoolTable,
+    region: Optional[str],
+    major: Optional[str],
+    year_from: Optional[int],
+    education_level: Optional[str],
+    scope: str,
+    major_codes: Tuple[str, ...],
+    major_names: Tuple[str, ...],
+) -> List[Dict[str, Any]]:
+    """列式筛选：整表走聚合立方体定位记录，子表按编码集合扫描行"""
+    conditions = school_conditions(
+        table, region, major, year_from, education_level, scope, major_codes, major_names
+    )
+    if table.rows is None:
+        cube = table.cube
+        return table.records(cube.row_ids(cube.cells(conditions)))
+    return table.records(table.scan(conditions))
+
+
+@timed("filter.schools", records=lambda scopes: len(scopes[0]))
+def filter_schools_scopes(
+    data: Sequence[Dict[str, Any]],
+    region: Optional[str] = None,
+    major: Optional[str] = None,
+    year_from: Optional[int] = None,
+    education_level: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    一次扫描同时得到 (区域结果, 全国结果)
+    区域结果 = 全国结果中 省份 == region 且来自 moe_majors_{region}_*.txt 的记录，
+    与 filter_schools(load_schools(region_filter=region), ..., "region") 一致
+    """
+    national = filter_schools(data, None, major, year_from, education_level, "national")
+    if not region:
+        return national, national
+    pattern = f"moe_majors_{region}_*.txt"
+    region_rows = [
+        item
+        for item in national
+        if item.get("省份") == region and fnmatch.fnmatchcase(item.get("_source_file", ""), pattern)
+    ]
+    return region_rows, national
 
 
 def unique_schools(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -134,23 +253,18 @@ def unique_schools_by_institution(data: List[Dict[str, Any]]) -> List[Dict[str,
     return out
 
 
-def filter_questionnaire_by_region(
-    data: List[Dict[str, Any]],
-    region: Optional[str],
-    region_columns: Optional[List[str]] = None,
-) -> List[Dict[str, Any]]:
+QUESTIONNAIRE_REGION_COLUMNS = ["省份", "城市", "所在地区", "地区", "区域"]
+
+
+def questionnaire_region_matcher(region: str) -> Callable[[str], bool]:
     """
-    按区域筛选问卷星（若存在区域相关列）
-    region_columns: 可能包含省/市信息的列名，如 ['省份','城市','所在地区']
+    问卷单元格区域匹配函数
     匹配规则：region 与单元格值互相包含，或去除「省」「市」后匹配
     """
-    if not region or not data:
-        return data
-    region_columns = region_columns or ["省份", "城市", "所在地区", "地区", "区域"]
     # 宽松匹配：广东省 / 广东、广州市 / 广州 互匹配
     region_norm = (region or "").replace("省", "").replace("市", "").strip()
 
-    def _match(region: str, cell_val: str) -> bool:
+    def _match(cell_val: str) -> bool:
         if not cell_val:
             return False
         s = str(cell_val).strip()
@@ -161,10 +275,29 @@ def filter_questionnaire_by_region(
             return True
         return False
 
+    return _match
+
+
+@timed("filter.questionnaire")
+def filter_questionnaire_by_region(
+    data: List[Dict[str, Any]],
+    region: Optional[str],
+    region_columns: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    按区域筛选问卷星（若存在区域相关列）
+    region_columns: 可能包含省/市信息的列名，如 ['省份','城市','所在地区']
+    匹配规则见 questionnaire_region_matcher；无任何匹配时返回全部数据
+    """
+    if not region or not data:
+        return data
+    region_columns = region_columns or QUESTIONNAIRE_REGION_COLUMNS
+    _match = questionnaire_region_matcher(region)
+
     result = []
     for row in data:
         for col in region_columns:
-            if col in row and _match(region, str(row[col] or "")):
+            if col in row and _match(str(row[col] or "")):
                 result.append(row)
                 break
     return result if result else data
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""
+文件 fingerprint：path + mtime + size 的摘要，数据源缓存、学校文件清单与问卷列式缓存共用
+只依赖标准库，cache / loader / manifest 均可直接导入
+"""
+
+import hashlib
+from pathlib import Path
+
+
+def file_fingerprint(path: Path) -> str:
+    """单文件 fingerprint = path + mtime + size，文件不存在时为空串"""
+    if not path.exists():
+        return ""
+    st = path.stat()
+    s = f"{path!s}|{st.st_mtime}|{st.st_size}"
+    return hashlib.sha256(s.encode()).hexdigest()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+学校目录多进程并行解析：按省份分块提交进程池，各进程独立解析并编码/预筛选，
+主进程按文件顺序合并，结果与单进程逐文件解析完全一致
+"""
+
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .config import INGEST_WORKERS
+from .filters import iter_filter_schools
+from .loader import iter_school_file, school_file_province
+from .snapshot import SCHOOL_FIELDS, SchoolTable, _TableBuilder, merge_parts
+
+
+def resolve_workers(workers: Optional[int] = None) -> int:
+    """worker 数：参数 > INGEST_WORKERS > CPU 核数"""
+    n = workers or INGEST_WORKERS or os.cpu_count() or 1
+    return max(1, int(n))
+
+
+def chunk_by_province(files: Sequence[Path]) -> List[List[Path]]:
+    """按省份分块，块内与块间均保持原文件顺序（同省文件在排序后连续）"""
+    return [list(g) for _, g in groupby(files, key=lambda fp: school_file_province(fp.name))]
+
+
+def _encode_chunk(paths: List[str]) -> Tuple[Dict[str, bytes], Dict[str, List[Optional[str]]], List[Tuple[str, int, int]]]:
+    """worker：解析并编码一个分块，返回 (列字节, 块内字典, 块内源文件区间)"""
+    builder = _TableBuilder()
+    sources: List[Tuple[str, int, int]] = []
+    for p in paths:
+        fp = Path(p)
+        start = builder.n
+        for rec in iter_school_file(fp):
+            builder.add(rec)
+        sources.append((fp.name, start, builder.n))
+    return {f: col.tobytes() for f, col in builder.columns.items()}, builder.dicts, sources
+
+
+def _filter_chunk(paths: List[str], kwargs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """worker：流式解析并预筛选一个分块，只回传命中记录"""
+    out: List[Dict[str, Any]] = []
+    for p in paths:
+        records = iter_school_file(Path(p))
+        out.extend(iter_filter_schools(records, **kwargs) if kwargs else records)
+    return out
+
+
+def _run(fn: Any, chunks: List[List[Path]], workers: int, *args: Any) -> List[Any]:
+    """在进程池中按分块执行 fn，按分块顺序返回结果；单 worker 时在本进程执行"""
+    jobs = [[str(p) for p in chunk] for chunk in chunks]
+    if workers <= 1 or len(jobs) <= 1:
+        return [fn(job, *args) for job in jobs]
+    # spawn 启动：编译可能由服务线程触发，避免 fork 带锁状态的多线程进程
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=ctx) as pool:
+        return list(pool.map(fn, jobs, *[[a] * len(jobs) for a in args]))
+
+
+def build_table_parallel(files: Sequence[Path], fingerprint: str = "", workers: Optional[int] = None) -> SchoolTable:
+    """多进程解析并编码为内存列式表，与 snapshot.build_table 结果一致"""
+    parts = _run(_encode_chunk, chunk_by_province(files), resolve_workers(workers))
+    return merge_parts(
+        (
+            ({f: array("i", col_bytes[f]) for f in SCHOOL_FIELDS}, local_dicts, local_sources)
+            for col_bytes, local_dicts, local_sources in parts
+        ),
+        fingerprint,
+    )
+
+
+def load_schools_parallel(
+    files: Sequence[Path],
+    workers: Optional[int] = None,
+    **filter_kwargs: Any,
+) -> List[Dict[str, Any]]:
+    """
+    多进程流式解析 moe_majors 文件并在 worker 内预筛选，按文件顺序返回命中记录
+    （loader.load_schools 读取非默认目录时经此加载）
+    filter_kwargs 同 filters.filter_schools（region / major / year_from / education_level / scope 等），
+    不传时返回全部记录
+    """
+    parts = _run(_filter_chunk, chunk_by_province(files), resolve_workers(workers), filter_kwargs)
+    return [rec for part in parts for rec in part]
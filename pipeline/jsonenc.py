@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 编码：已安装 orjson 时使用 orjson，否则使用标准库 json（ensure_ascii=False）
+HTTP 接口直接返回编码后的字节（JSONBytesResponse），跳过 FastAPI 的 jsonable_encoder 遍历
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """编码为 UTF-8 JSON 字节；indent 为 True 时两空格缩进（同 json.dumps(indent=2)）"""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        try:
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            pass  # orjson 不支持的类型（如超过 64 位的整数）回退标准库
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_str(obj: Any, indent: bool = False) -> str:
+    """同 dumps，返回 str（命令行输出用）"""
+    return dumps(obj, indent).decode("utf-8")
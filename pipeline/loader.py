@@ -4,26 +4,41 @@
 """
 
 import json
+import os
+import pickle
 import re
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from .config import (
     INSTITUTION_JSON,
+    QUESTIONNAIRE_CACHE,
     QUESTIONNAIRE_XLSX,
     SCHOOL_DIR,
     SCHOOL_FILE_PATTERN,
 )
+from .fingerprint import file_fingerprint
+from .timing import timed
 
 
+# 加载时写入机构记录的解析列
+ZONING_PROVINCE = "_province"
+ZONING_CITY = "_city"
+
+
+@timed("load.institutions")
 def load_institutions(path: Optional[Path] = None) -> List[Dict[str, Any]]:
-    """加载托育机构平台注册备案数据"""
+    """加载托育机构平台注册备案数据，并写入 _province / _city 解析列"""
     path = path or INSTITUTION_JSON
     if not path.exists():
         return []
     with open(path, "r", encoding="utf-8") as f:
         data = json.load(f)
-    return data if isinstance(data, list) else []
+    if not isinstance(data, list):
+        return []
+    annotate_zoning(data)
+    return data
 
 
 def parse_zoning(zoning_name: str) -> Tuple[str, str]:
@@ -84,6 +99,58 @@ def parse_zoning(zoning_name: str) -> Tuple[str, str]:
     return province, city
 
 
+@lru_cache(maxsize=16384)
+def resolve_zoning(zoning_name: str, zoning_code: str = "") -> Tuple[str, str]:
+    """
+    parse_zoning 的记忆化版本，按 (zoning_name, zoning_code) 缓存
+    不同区划名远少于机构数，同一区划只解析一次
+    """
+    return parse_zoning(zoning_name)
+
+
+def _zoning_key(item: Dict[str, Any]) -> Tuple[str, str]:
+    name = item.get("zoning_name")
+    code = item.get("zoning_code")
+    return (
+        name if isinstance(name, str) else "",
+        str(code).strip() if code is not None else "",
+    )
+
+
+def annotate_zoning(data: List[Dict[str, Any]]) -> None:
+    """为机构记录写入解析后的省、市列（ZONING_PROVINCE / ZONING_CITY），原地修改"""
+    for item in data:
+        prov, city = resolve_zoning(*_zoning_key(item))
+        item[ZONING_PROVINCE] = prov
+        item[ZONING_CITY] = city
+
+
+def institution_zoning(item: Dict[str, Any]) -> Tuple[str, str]:
+    """机构 (省, 市)：优先取加载时写入的解析列，否则查记忆化解析结果"""
+    prov = item.get(ZONING_PROVINCE)
+    if prov is not None:
+        return prov, item.get(ZONING_CITY) or ""
+    return resolve_zoning(*_zoning_key(item))
+
+
+_MAJOR_CODE_RE = re.compile(r"\((\d+[K]?)\)")
+
+
+@lru_cache(maxsize=16384)
+def parse_major(开设专业: str) -> Tuple[str, str]:
+    """
+    从 开设专业 解析 (专业名, 专业代码)，同一字符串只解析一次
+    例：早期教育 (570101K) -> (早期教育, 570101K)
+    例：国际工程物流管理_x000D_ (620515) -> (国际工程物流管理, 620515)
+    无代码时代码为空串
+    """
+    s = 开设专业 or ""
+    m = _MAJOR_CODE_RE.search(s)
+    if not m:
+        return s.replace("_x000D_", "").strip(), ""
+    return s[: m.start()].replace("_x000D_", "").strip(), m.group(1)
+
+
 def infer_host_type(item: Dict[str, Any]) -> str:
     """
     从 institution_type 推断举办主体
@@ -137,76 +204,217 @@ def infer_service_modes(item: Dict[str, Any]) -> List[str]:
     return modes
 
 
+# moe_majors 记录分隔符（出现在 备注： 之后，下一记录紧跟其后）
+SCHOOL_RECORD_SEP = "^_^"
+# 流式解析每次读入的字符数，内存只取决于块大小而非文件大小
+SCHOOL_READ_CHARS = 1 << 20
+
+
+_SCHOOL_PROVINCE_RE = re.compile(r"^moe_majors_(.+)_[^_]+\.txt$")
+
+
+def school_file_province(name: str) -> str:
+    """moe_majors_{省}_{年}.txt -> 省；不符合命名时返回文件名"""
+    m = _SCHOOL_PROVINCE_RE.match(name)
+    return m.group(1) if m else name
+
+
+def _school_glob(pattern: Optional[str], region_filter: Optional[str]) -> str:
+    if pattern:
+        return pattern
+    if region_filter:
+        return f"moe_majors_{region_filter}_*.txt"
+    return SCHOOL_FILE_PATTERN
+
+
+@timed("load.schools")
 def load_schools(
     dir_path: Optional[Path] = None,
     pattern: Optional[str] = None,
     region_filter: Optional[str] = None,
-) -> List[Dict[str, Any]]:
+    workers: Optional[int] = None,
+    **filter_kwargs: Any,
+) -> Sequence[Dict[str, Any]]:
     """
     加载托育学校注册备案数据
     记录格式：多行一组，用 ^_^ 分隔
     region_filter: 若指定，只加载 moe_majors_{region_filter}_*.txt，加速
+    filter_kwargs: 同 filters.filter_schools（region / major / year_from / education_level / scope 等），
+        传入时边读取边筛选，只保留命中记录
+    默认目录优先读取列式快照（见 pipeline.snapshot），快照失效时自动重建；
+    其余目录由 pipeline.ingest 按省份分块多进程流式解析并预筛选，按文件顺序合并
+    workers: 解析进程数，None 取 INGEST_WORKERS，1 为本进程
     """
+    table, files = _school_source(dir_path, pattern, region_filter)
+    if table is not None:
+        if filter_kwargs:
+            from .filters import filter_schools
+
+            return filter_schools(table, **filter_kwargs)
+        return table
+    from .ingest import load_schools_parallel
+
+    return load_schools_parallel(files, workers, **filter_kwargs)
+
+
+def iter_schools(
+    dir_path: Optional[Path] = None,
+    pattern: Optional[str] = None,
+    region_filter: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    流式版 load_schools：逐条产出记录，不在内存中保留整个语料
+    默认目录有快照时按行物化快照记录，否则逐文件流式解析
+    """
+    table, files = _school_source(dir_path, pattern, region_filter)
+    yield from (table if table is not None else iter_school_files(files))
+
+
+def _school_source(
+    dir_path: Optional[Path], pattern: Optional[str], region_filter: Optional[str]
+) -> Tuple[Optional[Sequence[Dict[str, Any]]], List[Path]]:
+    """默认目录有快照时为 (快照子表, [])，否则为 (None, 待解析的文件列表)"""
     dir_path = dir_path or SCHOOL_DIR
     if not dir_path.exists():
-        return []
+        return None, []
 
-    if pattern:
-        files = sorted(dir_path.glob(pattern))
-    elif region_filter:
-        files = sorted(dir_path.glob(f"moe_majors_{region_filter}_*.txt"))
-    else:
-        files = sorted(dir_path.glob(SCHOOL_FILE_PATTERN))
+    glob_pattern = _school_glob(pattern, region_filter)
+    if dir_path == SCHOOL_DIR:
+        from .snapshot import get_school_table
+
+        table = get_school_table()
+        if table is not None:
+            return table.select_sources(glob_pattern), []
+    return None, sorted(dir_path.glob(glob_pattern))
 
-    records: List[Dict[str, Any]] = []
 
+def iter_school_files(files: Iterable[Path]) -> Iterator[Dict[str, Any]]:
+    """按顺序流式解析多个 moe_majors 文件"""
     for fp in files:
-        try:
-            content = fp.read_text(encoding="utf-8")
-        except Exception:
-            continue
-        # 按 ^_^ 切分记录（备注字段值含 ^_^，下一记录紧跟）
-        blocks = re.split(re.escape("^_^"), content)
-        for block in blocks:
-            block = block.strip()
-            if not block:
-                continue
-            rec = _parse_school_block(block)
-            if rec and rec.get("开设专业"):
-                rec["_source_file"] = fp.name
-                records.append(rec)
-    return records
-
-
-def _parse_school_block(block: str) -> Dict[str, Any]:
-    """解析单条学校记录块"""
+        yield from iter_school_file(fp)
+
+
+def iter_school_file(fp: Path, chunk_chars: int = SCHOOL_READ_CHARS) -> Iterator[Dict[str, Any]]:
+    """
+    流式解析单个 moe_majors 文件，逐条产出记录
+    每次读入 chunk_chars 个字符按 ^_^ 切分，末尾不完整的记录并入下一块；
+    分隔符可出现在行中任意位置（通常为 备注：^_^机构名称：...），结果与整文件切分一致
+    chunk_chars 为 -1 时整文件读入；读取/解码出错时结束该文件（已产出的记录保留）
+    """
+    name = fp.name
+    tail = ""
+    try:
+        with open(fp, "r", encoding="utf-8") as f:
+            while True:
+                chunk = f.read(chunk_chars)
+                if not chunk:
+                    break
+                *blocks, tail = (tail + chunk).split(SCHOOL_RECORD_SEP)
+                for block in blocks:
+                    rec = _parse_school_block(block, name)
+                    if rec is not None:
+                        yield rec
+    except (OSError, ValueError):
+        return
+    rec = _parse_school_block(tail, name)
+    if rec is not None:
+        yield rec
+
+
+def _parse_school_block(block: str, name: str) -> Optional[Dict[str, Any]]:
+    """解析一条记录文本；无 开设专业 时返回 None"""
     rec: Dict[str, Any] = {}
-    for line in block.splitlines():
-        line = line.strip()
-        if "：" in line:
-            k, v = line.split("：", 1)
+    _parse_school_lines(block, rec)
+    if not rec.get("开设专业"):
+        return None
+    rec["_source_file"] = name
+    return rec
+
+
+def _parse_school_lines(text: str, rec: Dict[str, Any]) -> None:
+    """解析 键：值 行写入 rec（备注 不保留）"""
+    for line in text.splitlines():
+        k, sep, v = line.partition("：")
+        if sep:
             key = k.strip()
-            val = v.strip()
-            if key == "备注" and val.startswith("^_^"):
-                val = val[3:].strip()  # 去掉 ^_^ 前缀
             if key and key != "备注":
-                rec[key] = val
-    return rec
+                rec[key] = v.strip()
 
 
+@timed("load.questionnaire")
 def load_questionnaire(path: Optional[Path] = None) -> List[Dict[str, Any]]:
-    """加载问卷星 Excel 数据，返回行字典列表。优先用 pandas，失败则用 openpyxl"""
+    """
+    加载问卷星 Excel 数据，返回行字典列表。优先用 pandas，失败则用 openpyxl
+    解析结果按 fingerprint 缓存为列式 pickle（QUESTIONNAIRE_CACHE），工作簿未变更时不再解析 Excel
+    """
     path = path or QUESTIONNAIRE_XLSX
-    if not path.exists():
+    table = _questionnaire_table(path)
+    if table is None:
         return []
+    columns, rows = table
+    return [dict(zip(columns, row)) for row in rows]
+
 
+def load_questionnaire_columns(path: Optional[Path] = None) -> List[str]:
+    """获取问卷星表头列名（用于调试或动态映射），与 load_questionnaire 共用列式缓存"""
+    path = path or QUESTIONNAIRE_XLSX
+    table = _questionnaire_table(path)
+    return list(table[0]) if table is not None else []
+
+
+# 列式缓存格式版本，读取逻辑变化时递增
+_QUESTIONNAIRE_CACHE_VERSION = 1
+
+
+def _questionnaire_table(path: Path) -> Optional[Tuple[List[Any], List[Tuple[Any, ...]]]]:
+    """(列名, 行值元组) ：缓存 fingerprint 一致时直接读取，否则解析工作簿并写缓存；读取失败返回 None"""
+    if not path.exists():
+        return None
+    fingerprint = file_fingerprint(path)
+    try:
+        with open(QUESTIONNAIRE_CACHE, "rb") as f:
+            cached = pickle.load(f)
+        if (
+            cached.get("version") == _QUESTIONNAIRE_CACHE_VERSION
+            and cached.get("fingerprint") == fingerprint
+        ):
+            return cached["columns"], cached["rows"]
+    except Exception:
+        pass  # 缓存缺失或损坏，重新解析
+
+    table = _read_questionnaire_workbook(path)
+    if table is None:
+        return None
+    try:
+        QUESTIONNAIRE_CACHE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = QUESTIONNAIRE_CACHE.with_name(f"{QUESTIONNAIRE_CACHE.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {
+                    "version": _QUESTIONNAIRE_CACHE_VERSION,
+                    "fingerprint": fingerprint,
+                    "columns": table[0],
+                    "rows": table[1],
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp, QUESTIONNAIRE_CACHE)
+    except OSError:
+        pass
+    return table
+
+
+def _read_questionnaire_workbook(path: Path) -> Optional[Tuple[List[Any], List[Tuple[Any, ...]]]]:
+    """解析工作簿首个 sheet 为 (列名, 行值元组)。优先用 pandas，失败则用 openpyxl；均失败返回 None"""
     # 方式 1: pandas
     try:
         import pandas as pd
 
         df = pd.read_excel(path, sheet_name=0)
         df = df.fillna("")
-        return df.to_dict(orient="records")
+        records = df.to_dict(orient="records")
+        return list(df.columns), [tuple(r.values()) for r in records]
     except ImportError:
         pass
     except Exception:
@@ -219,7 +427,7 @@ def load_questionnaire(path: Optional[Path] = None) -> List[Dict[str, Any]]:
         wb = load_workbook(path, read_only=True, data_only=True)
         ws = wb.active
         if not ws:
-            return []
+            return None
         headers = [str(c.value).strip() if c.value is not None else "" for c in ws[1]]
         rows = []
         for row in ws.iter_rows(min_row=2):
@@ -227,37 +435,10 @@ def load_questionnaire(path: Optional[Path] = None) -> List[Dict[str, Any]]:
             for c in row:
                 v = c.value
                 vals.append("" if v is None else str(v).strip())
-            rows.append(dict(zip(headers, vals)))
+            rows.append(tuple(vals))
         wb.close()
-        return rows
+        return headers, rows
     except ImportError:
-        return []
+        return None
     except Exception:
-        return []
-
-
-def load_questionnaire_columns(path: Optional[Path] = None) -> List[str]:
-    """获取问卷星表头列名（用于调试或动态映射）"""
-    path = path or QUESTIONNAIRE_XLSX
-    if not path.exists():
-        return []
-    try:
-        import pandas as pd
-
-        df = pd.read_excel(path, sheet_name=0, nrows=1)
-        return list(df.columns)
-    except Exception:
-        pass
-    try:
-        from openpyxl import load_workbook
-
-        wb = load_workbook(path, read_only=True, data_only=True)
-        ws = wb.active
-        if ws:
-            cols = [str(c.value).strip() if c.value else "" for c in ws[1]]
-            wb.close()
-            return cols
-        wb.close()
-    except Exception:
-        pass
-    return []
+        return None
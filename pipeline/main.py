@@ -6,9 +6,10 @@
 """
 
 import argparse
-import json
 import sys
 
+from .jsonenc import dumps_str
+
 
 def main():
     parser = argparse.ArgumentParser(description="托育数据统计管道")
@@ -19,11 +20,15 @@ def main():
     parser.add_argument("--started_time", type=int, help="调研开始年份")
     parser.add_argument("--no-cache", action="store_true", help="禁用缓存，强制重新统计")
     parser.add_argument("--details-limit", type=int, default=10, help="详情条数上限")
+    parser.add_argument(
+        "--engine", choices=["python", "pandas"], default="python", help="统计引擎，pandas 为向量化实现"
+    )
     parser.add_argument(
         "--no-questionnaire-details",
         action="store_true",
         help="不输出问卷详情（questionnaire_posting、questionnaire_details_sample）",
     )
+    parser.add_argument("--timings", action="store_true", help="在 meta.timings 中输出各阶段耗时")
     args = parser.parse_args()
 
     from .api import get_stats
@@ -36,11 +41,13 @@ def main():
         started_time=args.started_time,
         details_limit=args.details_limit,
         use_cache=not args.no_cache,
+        engine=args.engine,
+        timings=args.timings,
     )
     if args.no_questionnaire_details and "details" in result:
         for key in ("questionnaire_posting", "questionnaire_details_sample"):
             result["details"].pop(key, None)
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(dumps_str(result, indent=True))
     return 0
 
 
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+开设专业倒排索引：专业代码 -> 专业编号，单字/双字片段 -> 专业编号
+专业编号即学校快照中 开设专业 列的字典编码，经聚合立方体可直接取到记录下标
+匹配口径与 filters._match_major 一致：指定 major 时按子串或代码匹配，否则按专业族（代码/名称子串）匹配
+"""
+
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .loader import parse_major
+
+_MEMO_MAX = 4096
+
+
+def _grams(s: str) -> Set[str]:
+    """单字与相邻双字片段"""
+    grams = set(s)
+    grams.update(s[i : i + 2] for i in range(len(s) - 1))
+    return grams
+
+
+class MajorIndex:
+    """
+    majors: 开设专业 取值列表（下标即专业编号，None/空串不参与索引）
+    """
+
+    def __init__(self, majors: Sequence[Optional[str]]) -> None:
+        self.majors = majors
+        self.parsed: List[Tuple[str, str]] = [parse_major(m or "") for m in majors]
+        self.by_code: Dict[str, Set[int]] = {}
+        self.by_gram: Dict[str, Set[int]] = {}
+        for i, m in enumerate(majors):
+            if not m:
+                continue
+            code = self.parsed[i][1]
+            if code:
+                self.by_code.setdefault(code, set()).add(i)
+            for g in _grams(m):
+                self.by_gram.setdefault(g, set()).add(i)
+        self._memo: Dict[Tuple[Optional[str], Tuple[str, ...], Tuple[str, ...]], Set[int]] = {}
+
+    def substring(self, q: str) -> Set[int]:
+        """开设专业 中包含 q 的专业编号：双字片段倒排求交后逐个校验"""
+        if not q:
+            return {i for i, m in enumerate(self.majors) if m}
+        grams = [q] if len(q) == 1 else [q[i : i + 2] for i in range(len(q) - 1)]
+        postings = sorted((self.by_gram.get(g, set()) for g in grams), key=len)
+        candidates = set.intersection(*postings) if postings else set()
+        return {i for i in candidates if q in self.majors[i]}
+
+    def code(self, code: str) -> Set[int]:
+        """专业代码精确匹配"""
+        return set(self.by_code.get(code, ()))
+
+    def family(self, codes: Iterable[str], names: Iterable[str]) -> Set[int]:
+        """专业族：开设专业 含任一代码或名称（如托育相关 TUOYU_MAJOR_CODES / TUOYU_MAJOR_NAMES）"""
+        ids: Set[int] = set()
+        for x in list(codes) + list(names):
+            ids |= self.substring(x)
+        return ids
+
+    def match(
+        self,
+        major: Optional[str],
+        major_codes: Tuple[str, ...],
+        major_names: Tuple[str, ...],
+    ) -> Set[int]:
+        """与 _match_major 同口径的专业编号集合（结果按参数记忆化，调用方勿修改）"""
+        key = (major or None, tuple(major_codes), tuple(major_names))
+        ids = self._memo.get(key)
+        if ids is None:
+            if major:
+                ids = self.substring(major) | self.code(major)
+            else:
+                ids = self.family(major_codes, major_names)
+            if len(self._memo) >= _MEMO_MAX:
+                self._memo.clear()
+            self._memo[key] = ids
+        return ids
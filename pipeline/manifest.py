@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+学校文件清单：MANIFEST_DIR/schools.json 记录每个 moe_majors 文件的 fingerprint、记录数与省份
+快照重建时据此只重新解析新增或变更的文件，并得出受影响的省份
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Set, Tuple
+
+from .config import MANIFEST_DIR
+from .fingerprint import file_fingerprint
+from .loader import school_file_province
+
+SCHOOL_MANIFEST = MANIFEST_DIR / "schools.json"
+
+
+def scan_files(files: Sequence[Path]) -> Dict[str, str]:
+    """当前各文件 fingerprint：{文件名: fingerprint}"""
+    return {fp.name: file_fingerprint(fp) for fp in files}
+
+
+def load_manifest(path: Optional[Path] = None) -> Optional[Dict[str, Any]]:
+    """
+    读取清单：{"fingerprint": 学校 fingerprint, "files": {文件名: {fingerprint, records, province}}}
+    不存在或损坏时返回 None
+    """
+    path = path or SCHOOL_MANIFEST
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+        return None
+    return manifest
+
+
+def save_manifest(
+    fingerprint: str,
+    file_fps: Dict[str, str],
+    sources: Sequence[Tuple[str, int, int]],
+    path: Optional[Path] = None,
+) -> None:
+    """按快照源文件区间写入清单（先写临时文件再替换）"""
+    path = path or SCHOOL_MANIFEST
+    files = {
+        name: {
+            "fingerprint": file_fps.get(name, ""),
+            "records": e - s,
+            "province": school_file_province(name),
+        }
+        for name, s, e in sources
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "files": files}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, path)
+
+
+def diff_manifest(
+    manifest: Dict[str, Any],
+    file_fps: Dict[str, str],
+    sources: Sequence[Tuple[str, int, int]],
+) -> Tuple[Set[str], Set[str]]:
+    """
+    对比清单与当前文件，返回 (新增或变更的文件, 已删除的文件)
+    清单记录数与快照中该文件行数不符时也视为变更
+    """
+    known = manifest["files"]
+    rows = {name: e - s for name, s, e in sources}
+    changed = {
+        name
+        for name, fp in file_fps.items()
+        if name not in known
+        or known[name].get("fingerprint") != fp
+        or known[name].get("records") != rows.get(name)
+    }
+    removed = set(known) - set(file_fps)
+    return changed, removed
+
+
+def touched_provinces(names: Set[str]) -> Set[str]:
+    """文件名集合涉及的省份"""
+    return {school_file_province(name) for name in names}
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+全国基线缓存：统计结果的 national 部分与区域、院校无关（学校部分只取决于专业/年份/学历），
+按 (引擎, 基线键, 所依赖数据源 fingerprint) 进程内缓存，区域查询直接拼入，只计算区域部分；
+缓存值在各结果间共享，调用方不应原地修改
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .config import NATIONAL_CACHE_MAX_ENTRIES
+from .sections import SECTION_SOURCES, section_fingerprints
+
+
+class NationalView:
+    """
+    某一引擎、某一组 fingerprint 下的基线视图，作为 compute_sections 的 national 记忆表使用
+    键为 (段, ...)，如 ("institution",)、("school", major, started_time, education_level)，
+    值随该段所依赖数据源的 fingerprint 失效
+    """
+
+    def __init__(self, baseline: "NationalBaseline", engine: str, fingerprints: Dict[str, str]) -> None:
+        self._baseline = baseline
+        self._engine = engine
+        self._fingerprints = fingerprints
+
+    def _key(self, key: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        fps = section_fingerprints(key[0], self._fingerprints)
+        return (self._engine, key, tuple(fps[src] for src in SECTION_SOURCES[key[0]]))
+
+    def get(self, key: Tuple[Any, ...], default: Any = None) -> Any:
+        return self._baseline._get(self._key(key), default)
+
+    def __setitem__(self, key: Tuple[Any, ...], value: Any) -> None:
+        self._baseline._put(self._key(key), value)
+
+
+class NationalBaseline:
+    """
+    全国基线 LRU 缓存
+    max_entries: 条目数上限（每个不同的基线键一条），超出时淘汰最久未用的
+    """
+
+    def __init__(self, max_entries: int = NATIONAL_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Any, ...], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def view(self, engine: str, fingerprints: Dict[str, str]) -> NationalView:
+        """取 engine 在 fingerprints 下的基线视图"""
+        return NationalView(self, engine, fingerprints)
+
+    def _get(self, key: Tuple[Any, ...], default: Any) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def _put(self, key: Tuple[Any, ...], value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_baseline: Optional[NationalBaseline] = None
+_baseline_lock = threading.Lock()
+
+
+def get_national_baseline() -> NationalBaseline:
+    """进程级全国基线缓存"""
+    global _baseline
+    with _baseline_lock:
+        if _baseline is None:
+            _baseline = NationalBaseline()
+        return _baseline
@@ -4,9 +4,12 @@
 用于产业区域分析报告、人才需求分析报告中的图表生成与实时数据
 """
 
+import hashlib
+import json
 import re
 from typing import Any, Dict, List, Optional, Tuple
 
+from .cache import SingleFlight, get_data_fingerprints, get_store
 from .filters import filter_questionnaire_by_region
 from .loader import load_questionnaire
 
@@ -295,22 +298,76 @@ def _empty_result(region: Optional[str] = None) -> Dict[str, Any]:
     }
 
 
+_DEMAND_KEY_PREFIX = "demand:"
+_demand_flight = SingleFlight()
+
+
+def _demand_key(
+    region: Optional[str],
+    filter_meaningless_postings: bool,
+    details_limit: int,
+    columns_override: Optional[Dict[str, str]],
+    fingerprint: str,
+) -> str:
+    """人才需求缓存键：区域、过滤开关、raw_sample 上限、列名映射与问卷 fingerprint"""
+    parts = [
+        (region or "").strip(),
+        bool(filter_meaningless_postings),
+        int(details_limit),
+        sorted((columns_override or {}).items()),
+        fingerprint,
+    ]
+    s = json.dumps(parts, ensure_ascii=False)
+    return _DEMAND_KEY_PREFIX + hashlib.sha256(s.encode()).hexdigest()
+
+
 def get_talent_demand(
     region: Optional[str] = None,
     use_cache: bool = False,
     details_limit: int = 10,
     filter_meaningless_postings: bool = True,
+    data: Optional[List[Dict[str, Any]]] = None,
+    columns_override: Optional[Dict[str, str]] = None,
+    fingerprint: Optional[str] = None,
     **kwargs: Any,
 ) -> Dict[str, Any]:
     """
     获取人才需求提取结果（可与 api.get_stats 配合使用）
-    use_cache: 暂未实现，保留接口兼容
+    use_cache: 按 (区域, 过滤开关, details_limit, columns_override, 问卷 fingerprint) 缓存结果，
+               并合并同键并发请求，只计算一次
     details_limit: raw_sample 条数上限
     filter_meaningless_postings: 是否过滤无意义岗位（默认 True）
+    data: 已加载的问卷星行（如来自 DatasetRegistry），None 时自动加载
+    columns_override: 自定义列名映射，同 extract_talent_demand
+    fingerprint: data 对应的问卷 fingerprint（如 Datasets.fingerprints["questionnaire"]），作为缓存键的一部分；
+                 None 时取当前 fingerprint（传入 data 时应同时传入，避免问卷更新期间旧结果记在新 fingerprint 下）
     """
-    return extract_talent_demand(
-        data=None,
-        region=region,
-        raw_sample_limit=details_limit,
-        filter_meaningless_postings=filter_meaningless_postings,
-    )
+    def _compute() -> Dict[str, Any]:
+        return extract_talent_demand(
+            data=data,
+            region=region,
+            columns_override=columns_override,
+            raw_sample_limit=details_limit,
+            filter_meaningless_postings=filter_meaningless_postings,
+        )
+
+    if not use_cache:
+        return _compute()
+
+    if fingerprint is None:
+        fingerprint = get_data_fingerprints().get("questionnaire", "")
+    key = _demand_key(region, filter_meaningless_postings, details_limit, columns_override, fingerprint)
+    cached = get_store().get(key)
+    if cached is not None:
+        return cached
+
+    def _compute_and_store() -> Dict[str, Any]:
+        # 排队期间可能已由其他进程写入
+        cached = get_store().get(key)
+        if cached is not None:
+            return cached
+        result = _compute()
+        get_store().put(key, result)
+        return result
+
+    return _demand_flight.do(key, _compute_and_store)
@@ -13,9 +13,9 @@
 """
 
 import argparse
-import json
 import sys
 
+from .jsonenc import dumps_str
 from .loader import load_questionnaire
 from .questionnaire_extract import get_talent_demand
 
@@ -29,7 +29,7 @@ def main() -> int:
     parser.add_argument("--region", type=str, help="区域，如 安徽省、广东省")
     parser.add_argument("--education_level", type=str, help="学历层次（保留参数）")
     parser.add_argument("--started_time", type=int, help="调研开始年份（保留参数）")
-    parser.add_argument("--no-cache", action="store_true", help="禁用缓存（保留参数）")
+    parser.add_argument("--no-cache", action="store_true", help="禁用结果缓存")
     parser.add_argument("--details-limit", type=int, default=10, help="raw_sample 条数上限")
     parser.add_argument(
         "--no-filter-meaningless",
@@ -54,7 +54,7 @@ def main() -> int:
                 file=sys.stderr,
             )
 
-    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(dumps_str(result, indent=True))
     return 0
 
 
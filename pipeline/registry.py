@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+进程内数据集注册表：常驻内存的机构、问卷星、学校数据
+按数据源 fingerprint 热加载，整体替换版本，进行中的请求始终持有一致的快照
+"""
+
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .cache import get_data_fingerprints
+from .loader import load_institutions, load_questionnaire, load_schools
+from .snapshot import SchoolTable
+
+# 数据源 -> 加载函数，键与 get_data_fingerprints 一致
+SOURCES: Dict[str, Callable[[], Sequence[Dict[str, Any]]]] = {
+    "institution": load_institutions,
+    "questionnaire": load_questionnaire,
+    "school": load_schools,
+}
+
+
+@dataclass(frozen=True)
+class Datasets:
+    """某一版本的全部数据集（只读）"""
+
+    institutions: List[Dict[str, Any]]
+    questionnaire: List[Dict[str, Any]]
+    schools: Sequence[Dict[str, Any]]
+    fingerprints: Dict[str, str]
+    version: int = 0
+    load_info: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+class DatasetRegistry:
+    """
+    数据集注册表
+    get() 检查各数据源 fingerprint，仅重新加载变化的数据源，并原子替换当前版本
+    """
+
+    def __init__(self) -> None:
+        self._current: Optional[Datasets] = None
+        self._reload_lock = threading.Lock()
+
+    def get(self) -> Datasets:
+        fps = get_data_fingerprints()
+        current = self._current
+        if current is not None and current.fingerprints == fps:
+            return current
+        with self._reload_lock:
+            current = self._current
+            stale = [s for s in SOURCES if current is None or current.fingerprints.get(s) != fps.get(s)]
+            if not stale:
+                return current
+            values: Dict[str, Any] = {
+                "institution": current.institutions if current else [],
+                "questionnaire": current.questionnaire if current else [],
+                "school": current.schools if current else [],
+            }
+            load_info = dict(current.load_info) if current else {}
+            for source in stale:
+                t0 = time.perf_counter()
+                values[source] = SOURCES[source]()
+                load_info[source] = {
+                    "fingerprint": fps.get(source, ""),
+                    "loaded_at": time.time(),
+                    "load_seconds": round(time.perf_counter() - t0, 4),
+                    "records": len(values[source]),
+                    "approx_bytes": _approx_bytes(values[source]),
+                }
+            new = Datasets(
+                institutions=values["institution"],
+                questionnaire=values["questionnaire"],
+                schools=values["school"],
+                fingerprints=dict(fps),
+                version=(current.version + 1) if current else 1,
+                load_info=load_info,
+            )
+            self._current = new
+            return new
+
+    def stats(self) -> Dict[str, Any]:
+        """当前版本、各数据源加载耗时与内存占用估算（不触发加载）"""
+        current = self._current
+        if current is None:
+            return {"loaded": False, "version": 0, "sources": {}, "approx_bytes": 0}
+        return {
+            "loaded": True,
+            "version": current.version,
+            "sources": current.load_info,
+            "approx_bytes": sum(info.get("approx_bytes", 0) for info in current.load_info.values()),
+        }
+
+    def clear(self) -> None:
+        """丢弃当前版本，下次 get() 全量重新加载"""
+        with self._reload_lock:
+            self._current = None
+
+
+def _approx_bytes(data: Sequence[Dict[str, Any]], sample: int = 200) -> int:
+    """
+    估算数据集内存占用
+    SchoolTable 按列缓冲与字典计算；记录列表按抽样记录的平均大小外推
+    """
+    if isinstance(data, SchoolTable):
+        total = sum(len(col) * col.itemsize for col in data.columns.values())
+        for values in data.dicts.values():
+            total += sys.getsizeof(values) + sum(sys.getsizeof(v) for v in values)
+        return total
+    n = len(data)
+    if not n:
+        return sys.getsizeof(data)
+    step = max(1, n // sample)
+    picked = [data[i] for i in range(0, n, step)]
+    per_record = sum(
+        sys.getsizeof(rec) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in rec.items())
+        for rec in picked
+    ) / len(picked)
+    return int(sys.getsizeof(data) + per_record * n)
+
+
+_registry = DatasetRegistry()
+
+
+def get_registry() -> DatasetRegistry:
+    """进程级默认注册表"""
+    return _registry
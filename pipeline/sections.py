@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+统计结果分段：按依赖的数据源把 compute_stats 返回结构拆为
+institution（机构）、school（学校区域部分与详情）、school_national（学校全国部分）、
+questionnaire（问卷星）、cross（机构 × 问卷交叉验证）五段，各段单独缓存、单独按其数据源 fingerprint 失效与重算
+学校区域部分只来自该省份的学校文件，按省份 fingerprint（school:{省份}）失效，其他省份的文件更新不影响
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+# 段 -> 依赖的数据源（cache.get_data_fingerprints 的键）
+SECTION_SOURCES: Dict[str, Tuple[str, ...]] = {
+    "institution": ("institution",),
+    "school": ("school",),
+    "school_national": ("school",),
+    "questionnaire": ("questionnaire",),
+    "cross": ("institution", "questionnaire"),
+}
+SECTIONS = tuple(SECTION_SOURCES)
+
+# 返回结构中的字段顺序及所属段 (字段, region 所属段, national 所属段)（stats.region / stats.national 同构）
+STATS_FIELDS = (
+    ("institution_count", "institution", "institution"),
+    ("city_distribution", "institution", "institution"),
+    ("host_type_distribution", "institution", "institution"),
+    ("puhui_distribution", "institution", "institution"),
+    ("service_mode_distribution", "institution", "institution"),
+    ("_inferred_note", "institution", "institution"),
+    ("school_count", "school", "school_national"),
+    ("school_distribution", "school", "school_national"),
+    ("posting_sample_count", "questionnaire", "questionnaire"),
+    ("matched_institution_count", "cross", "cross"),
+)
+SCOPES = ("region", "national")
+
+# 学校文件按省份的 fingerprint 键前缀（cache.get_data_fingerprints 中的 school:{省份}）
+SCHOOL_PROVINCE_PREFIX = "school:"
+DETAIL_FIELDS = (
+    ("institutions", "institution"),
+    ("schools", "school"),
+    ("questionnaire_posting", "questionnaire"),
+    ("questionnaire_details_sample", "questionnaire"),
+    ("cross_validation", "cross"),
+)
+
+
+def section_keys(section: str, region: Optional[str] = None) -> Tuple[str, ...]:
+    """
+    段有效性所依据的 fingerprint 键：指定区域的 school 段只依赖 moe_majors_{区域}_*.txt，
+    取 school:{区域}（无此省份文件时为空串，区域部分恒为空）；其余同 SECTION_SOURCES
+    """
+    region = (region or "").strip()
+    if section == "school" and region and not any(c in region for c in "*?["):
+        return (SCHOOL_PROVINCE_PREFIX + region,)
+    return SECTION_SOURCES[section]
+
+
+def section_fingerprints(section: str, fingerprints: Dict[str, str], region: Optional[str] = None) -> Dict[str, str]:
+    """段（在 region 下）所依赖数据源的 fingerprint"""
+    return {src: fingerprints.get(src, "") for src in section_keys(section, region)}
+
+
+def source_fingerprints(fingerprints: Dict[str, str]) -> Dict[str, str]:
+    """去掉按省份的学校 fingerprint，只保留各数据源整体 fingerprint（meta.fingerprints 用）"""
+    return {k: v for k, v in fingerprints.items() if not k.startswith(SCHOOL_PROVINCE_PREFIX)}
+
+
+def split_result(result: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """完整结果 -> {段: {"region": {...}, "national": {...}, "details": {...}}}"""
+    sections: Dict[str, Dict[str, Any]] = {
+        s: {"region": {}, "national": {}, "details": {}} for s in SECTIONS
+    }
+    for field, *owners in STATS_FIELDS:
+        for scope, s in zip(SCOPES, owners):
+            sections[s][scope][field] = result["stats"][scope][field]
+    for field, s in DETAIL_FIELDS:
+        sections[s]["details"][field] = result["details"][field]
+    return sections
+
+
+def merge_sections(sections: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """各段 -> 完整结果（字段顺序与 compute_stats 一致），需包含全部段"""
+    return {
+        "stats": {
+            scope: {field: sections[owners[i]][scope][field] for field, *owners in STATS_FIELDS}
+            for i, scope in enumerate(SCOPES)
+        },
+        "details": {field: sections[s]["details"][field] for field, s in DETAIL_FIELDS},
+    }
@@ -7,22 +7,62 @@
      uvicorn pipeline.server:app --host 0.0.0.0 --port 7806
 """
 
-from typing import Any, Dict, Optional
+import hashlib
+import json
+import math
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Literal, Optional, Tuple
 
 try:
-    from fastapi import FastAPI, Query
+    from fastapi import FastAPI, Query, Request
     from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, Response, StreamingResponse
     from pydantic import BaseModel
+    from starlette.background import BackgroundTask
+    from starlette.concurrency import run_in_threadpool
 except ImportError:
     raise ImportError("请安装: pip install fastapi uvicorn")
 
-from .api import get_stats
+from .api import get_stats, get_stats_batch, stream_stats
+from .cache import get_data_fingerprints, get_response_cache
+from .config import HTTP_CACHE_MAX_AGE, WARM_ON_STARTUP, WARM_WATCH_SECONDS
+from .executor import ComputeSlot, DeadlineExceeded, Overloaded, get_executor
+from .jsonenc import dumps
+from .national import get_national_baseline
 from .questionnaire_extract import get_talent_demand
+from .registry import get_registry
+from .stream import DEFAULT_CHUNK_ROWS, MEDIA_TYPES, iter_encoded
+from .timing import render_prometheus
+from .warm import Warmer
+
+
+class JSONBytesResponse(Response):
+    """JSON 响应：bytes 原样输出（已序列化的缓存响应），其余经 jsonenc.dumps（orjson 优先）编码，不经 jsonable_encoder"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dumps(content)
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI) -> Any:
+    """WARM_ON_STARTUP 开启时在后台线程预热缓存（默认关闭），并按 WARM_WATCH_SECONDS 检查数据更新后重新预热"""
+    warmer = None
+    if WARM_ON_STARTUP:
+        warmer = Warmer(interval=WARM_WATCH_SECONDS, workers=1, registry=get_registry())
+        warmer.start()
+    yield
+    if warmer is not None:
+        warmer.stop()
+    get_executor().shutdown(wait=False)
+
 
 app = FastAPI(
     title="托育数据统计管道 API",
     description="机构、学校、问卷星统计与人才需求提取",
     version="1.0",
+    lifespan=_lifespan,
 )
 
 app.add_middleware(
@@ -34,6 +74,21 @@ app.add_middleware(
 )
 
 
+# 统计计算在有界线程池中执行（pipeline.executor）：排队已满返回 503 + Retry-After，超过截止时间返回 504
+@app.exception_handler(Overloaded)
+async def _overloaded_handler(request: Request, exc: Overloaded) -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(math.ceil(exc.retry_after)))},
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def _deadline_handler(request: Request, exc: DeadlineExceeded) -> JSONResponse:
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
+
 # --- 请求体模型 ---
 
 class StatsRequest(BaseModel):
@@ -45,12 +100,36 @@ class StatsRequest(BaseModel):
     details_limit: int = 50
     use_cache: bool = True
     no_questionnaire_details: bool = False
+    engine: Literal["python", "pandas"] = "python"
+    timings: bool = False
+
+
+class StatsStreamRequest(StatsRequest):
+    format: Literal["ndjson", "sse"] = "ndjson"
+    chunk_size: int = DEFAULT_CHUNK_ROWS
+
+
+class StatsQuery(BaseModel):
+    school: Optional[str] = None
+    major: Optional[str] = None
+    region: Optional[str] = None
+    education_level: Optional[str] = None
+    started_time: Optional[int] = None
+    details_limit: int = 50
+
+
+class StatsBatchRequest(BaseModel):
+    queries: List[StatsQuery]
+    use_cache: bool = True
+    no_questionnaire_details: bool = False
+    engine: Literal["python", "pandas"] = "python"
 
 
 class JobDemandRequest(BaseModel):
     region: Optional[str] = None
     details_limit: int = 10
     filter_meaningless_postings: bool = True
+    use_cache: bool = True
 
 
 # --- 接口 ---
@@ -62,11 +141,169 @@ def root() -> Dict[str, str]:
         "docs": "/docs",
         "stats": "/stats",
         "job_demand": "/job_demand",
+        "datasets": "/datasets",
+        "metrics": "/metrics",
     }
 
 
+@app.get("/datasets", response_model=None)
+def api_get_datasets() -> Dict[str, Any]:
+    """常驻数据集状态：版本、各数据源 fingerprint、加载耗时、记录数与内存占用估算"""
+    return get_registry().stats()
+
+
+@app.get("/metrics", response_model=None)
+def api_get_metrics() -> Response:
+    """Prometheus 文本格式指标：各阶段耗时直方图与记录数、计算线程池、全国基线与响应缓存"""
+    executor = get_executor().stats()
+    baseline = get_national_baseline()
+    responses = get_response_cache()
+    gauges = [
+        ("pipeline_compute_pending", "gauge", "计算线程池排队与执行中的请求数", executor["pending"]),
+        ("pipeline_compute_rejected_total", "counter", "因排队已满被拒绝（503）的请求数", executor["rejected"]),
+        ("pipeline_compute_timed_out_total", "counter", "超过截止时间（504）的请求数", executor["timed_out"]),
+        ("pipeline_national_cache_hits_total", "counter", "全国基线缓存命中次数", baseline.hits),
+        ("pipeline_national_cache_misses_total", "counter", "全国基线缓存未命中次数", baseline.misses),
+        ("pipeline_national_cache_entries", "gauge", "全国基线缓存条目数", len(baseline)),
+        ("pipeline_response_cache_entries", "gauge", "已序列化响应缓存条目数", len(responses)),
+        ("pipeline_response_cache_bytes", "gauge", "已序列化响应缓存字节数", responses.nbytes),
+    ]
+    return Response(render_prometheus(gauges), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+_QUESTIONNAIRE_DETAIL_KEYS = ("questionnaire_posting", "questionnaire_details_sample")
+
+
+def _strip_questionnaire_details(result: Dict[str, Any]) -> Dict[str, Any]:
+    """去掉问卷详情（返回新 dict，批量结果中相同查询共用同一结果对象）"""
+    if "details" not in result:
+        return result
+    details = {k: v for k, v in result["details"].items() if k not in _QUESTIONNAIRE_DETAIL_KEYS}
+    return {**result, "details": details}
+
+
+def _compute_stats(no_questionnaire_details: bool = False, **query: Any) -> Dict[str, Any]:
+    """在计算线程中执行 get_stats，并按需去掉问卷详情"""
+    result = get_stats(registry=get_registry(), **query)
+    return _strip_questionnaire_details(result) if no_questionnaire_details else result
+
+
+# 已序列化响应缓存（cache.ResponseCache）的键字段与所依赖数据源
+_STATS_KEY_FIELDS = ("school", "major", "region", "education_level", "started_time", "details_limit", "engine")
+_STATS_SOURCES = ("institution", "questionnaire", "school")
+
+
+def _response_fps(sources: Any, fps: Dict[str, str]) -> Any:
+    return tuple(fps.get(src, "") for src in sources)
+
+
+def _stats_key(no_questionnaire_details: bool, query: Dict[str, Any]) -> Tuple[Any, ...]:
+    return ("stats", no_questionnaire_details, *(query.get(f) for f in _STATS_KEY_FIELDS))
+
+
+def _job_demand_key(query: Dict[str, Any]) -> Tuple[Any, ...]:
+    return ("job_demand", query.get("region"), query.get("details_limit"), query.get("filter_meaningless_postings"))
+
+
+def _etag(key: Tuple[Any, ...], fps: Tuple[str, ...]) -> str:
+    """弱 ETag：由查询键与所依赖数据源 fingerprint 计算（首次计算与缓存命中的 meta 不同，语义等价）"""
+    s = json.dumps([list(key), list(fps)], ensure_ascii=False, default=str)
+    return 'W/"' + hashlib.sha256(s.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 弱比较"""
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+async def _conditional_get(
+    request: Request, key: Tuple[Any, ...], sources: Tuple[str, ...], cacheable: bool, fn: Any, **query: Any
+) -> Response:
+    """
+    条件 GET：按 (查询键, 数据源 fingerprint) 计算 ETag，与 If-None-Match 相符时直接返回 304，不进入计算线程池；
+    否则在计算线程池中执行 fn(**query) 得到 JSON 字节。cacheable 为 False（use_cache=False）时不带 ETag，
+    Cache-Control 为 no-store
+    """
+    if not cacheable:
+        body = await get_executor().run(fn, **query)
+        return JSONBytesResponse(body, headers={"Cache-Control": "no-store"})
+    fps = _response_fps(sources, await run_in_threadpool(get_data_fingerprints))
+    etag = _etag(key, fps)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={HTTP_CACHE_MAX_AGE}"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    body = await get_executor().run(fn, **query)
+    return JSONBytesResponse(body, headers=headers)
+
+
+def _compute_stats_body(no_questionnaire_details: bool = False, **query: Any) -> bytes:
+    """
+    在计算线程中执行 get_stats 并编码为 JSON 字节
+    use_cache 时先查已序列化响应缓存，命中直接返回存储的字节；未命中时按命中形态（meta.from_cache 为 True）存入
+    timings 时不经响应缓存（各阶段耗时属于本次调用）
+    """
+    use_cache = query.get("use_cache", True) and not query.get("timings")
+    key = _stats_key(no_questionnaire_details, query)
+    responses = get_response_cache()
+    if use_cache:
+        body = responses.get(key, _response_fps(_STATS_SOURCES, get_data_fingerprints()))
+        if body is not None:
+            return body
+    result = _compute_stats(no_questionnaire_details, **query)
+    body = dumps(result)
+    if use_cache:
+        meta = result["meta"]
+        hit = body if meta["from_cache"] else dumps(
+            {**result, "meta": {**meta, "from_cache": True, "recomputed_sections": []}}
+        )
+        responses.put(key, _response_fps(_STATS_SOURCES, meta["fingerprints"]), hit)
+    return body
+
+
+def _compute_stats_batch(req: StatsBatchRequest) -> Dict[str, Any]:
+    """在计算线程中执行 get_stats_batch"""
+    results = get_stats_batch(
+        [q.model_dump() for q in req.queries],
+        use_cache=req.use_cache,
+        registry=get_registry(),
+        engine=req.engine,
+    )
+    if req.no_questionnaire_details:
+        results = [_strip_questionnaire_details(r) for r in results]
+    return {
+        "results": results,
+        "from_cache": [r["meta"]["from_cache"] for r in results],
+    }
+
+
+def _compute_job_demand(datasets: Any, **query: Any) -> Dict[str, Any]:
+    """在计算线程中执行 get_talent_demand（问卷数据及其 fingerprint 取自同一版本常驻数据集）"""
+    return get_talent_demand(
+        data=datasets.questionnaire, fingerprint=datasets.fingerprints.get("questionnaire", ""), **query
+    )
+
+
+def _compute_job_demand_body(**query: Any) -> bytes:
+    """在计算线程中执行 get_talent_demand 并编码为 JSON 字节，use_cache 时经已序列化响应缓存"""
+    use_cache = query.get("use_cache", False)
+    if not use_cache:
+        return dumps(_compute_job_demand(get_registry().get(), **query))
+    key = _job_demand_key(query)
+    responses = get_response_cache()
+    body = responses.get(key, _response_fps(("questionnaire",), get_data_fingerprints()))
+    if body is None:
+        datasets = get_registry().get()
+        body = dumps(_compute_job_demand(datasets, **query))
+        responses.put(key, _response_fps(("questionnaire",), datasets.fingerprints), body)
+    return body
+
+
 @app.get("/stats", response_model=None)
-def api_get_stats(
+async def api_get_stats(
+    request: Request,
     school: Optional[str] = Query(None, description="院校名称"),
     major: Optional[str] = Query(None, description="专业，如 520802 或 婴幼儿托育服务与管理"),
     region: Optional[str] = Query(None, description="区域，如 广东省、广州市"),
@@ -75,9 +312,109 @@ def api_get_stats(
     details_limit: int = Query(50, ge=0, le=500),
     use_cache: bool = Query(True),
     no_questionnaire_details: bool = Query(False, description="不返回问卷详情"),
-) -> Dict[str, Any]:
-    """机构、学校、问卷星综合统计（对应 pipeline.main）"""
-    result = get_stats(
+    engine: Literal["python", "pandas"] = Query("python", description="统计引擎：python / pandas"),
+    timings: bool = Query(False, description="在 meta.timings 中返回各阶段耗时（不经响应缓存）"),
+) -> Response:
+    """机构、学校、问卷星综合统计（对应 pipeline.main）；支持 ETag / If-None-Match"""
+    query = {
+        "school": school,
+        "major": major,
+        "region": region,
+        "education_level": education_level,
+        "started_time": started_time,
+        "details_limit": details_limit,
+        "use_cache": use_cache,
+        "engine": engine,
+        "timings": timings,
+    }
+    return await _conditional_get(
+        request,
+        _stats_key(no_questionnaire_details, query),
+        _STATS_SOURCES,
+        use_cache and not timings,
+        _compute_stats_body,
+        no_questionnaire_details=no_questionnaire_details,
+        **query,
+    )
+
+
+@app.post("/stats", response_model=None)
+async def api_post_stats(req: StatsRequest) -> Response:
+    """机构、学校、问卷星综合统计（POST 请求体）"""
+    return JSONBytesResponse(await get_executor().run(
+        _compute_stats_body,
+        no_questionnaire_details=req.no_questionnaire_details,
+        school=req.school,
+        major=req.major,
+        region=req.region,
+        education_level=req.education_level,
+        started_time=req.started_time,
+        details_limit=req.details_limit,
+        use_cache=req.use_cache,
+        engine=req.engine,
+        timings=req.timings,
+    ))
+
+
+def _compute_stats_stream(no_questionnaire_details: bool = False, **query: Any) -> Tuple[Dict[str, Any], Any]:
+    """在计算线程中计算统计汇总（api.stream_stats），返回 (汇总, 详情行迭代器)"""
+    summary, rows = stream_stats(registry=get_registry(), **query)
+    return (_strip_questionnaire_details(summary) if no_questionnaire_details else summary), rows
+
+
+async def _stream_stats(fmt: str, chunk_size: int, **query: Any) -> StreamingResponse:
+    """
+    整个输出期间占用计算线程池的一个排队名额（计入 /metrics 的 pending，排队已满返回 503）：
+    汇总在计算线程池中算完即输出（超过截止时间返回 504），机构、学校详情随后同样在计算线程池中逐块生成、编码并输出
+    """
+    slot = get_executor().hold()
+    try:
+        summary, rows = await slot.run(_compute_stats_stream, chunk_size=chunk_size, **query)
+    except BaseException:
+        slot.release()
+        raise
+    return StreamingResponse(
+        _stream_body(slot, iter_encoded(summary, fmt, chunk_size, rows)),
+        media_type=MEDIA_TYPES[fmt],
+        background=BackgroundTask(slot.release),
+    )
+
+
+async def _stream_body(slot: ComputeSlot, chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    逐块在计算线程池中取下一个编码块（详情行的筛选与物化随之在线程池中进行）并输出；
+    某块超过截止时间时中止输出，结束或客户端断开时归还名额
+    """
+    try:
+        while True:
+            chunk = await slot.run(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        slot.release()
+
+
+@app.get("/stats/stream", response_model=None)
+async def api_get_stats_stream(
+    school: Optional[str] = Query(None, description="院校名称"),
+    major: Optional[str] = Query(None, description="专业，如 520802 或 婴幼儿托育服务与管理"),
+    region: Optional[str] = Query(None, description="区域，如 广东省、广州市"),
+    education_level: Optional[str] = Query(None, description="学历层次"),
+    started_time: Optional[int] = Query(None, description="调研开始年份"),
+    details_limit: int = Query(50, ge=0, le=500),
+    use_cache: bool = Query(True),
+    no_questionnaire_details: bool = Query(False, description="不返回问卷详情"),
+    engine: Literal["python", "pandas"] = Query("python", description="统计引擎：python / pandas"),
+    format: Literal["ndjson", "sse"] = Query("ndjson", description="流式格式：ndjson / sse"),
+    chunk_size: int = Query(DEFAULT_CHUNK_ROWS, ge=1, le=500, description="列表详情每块行数"),
+    timings: bool = Query(False, description="在 meta.timings 中返回各阶段耗时"),
+) -> StreamingResponse:
+    """综合统计流式输出：先输出统计汇总，再逐段输出详情（列表详情分块）"""
+    return await _stream_stats(
+        format,
+        chunk_size,
+        no_questionnaire_details=no_questionnaire_details,
         school=school,
         major=major,
         region=region,
@@ -85,17 +422,18 @@ def api_get_stats(
         started_time=started_time,
         details_limit=details_limit,
         use_cache=use_cache,
+        engine=engine,
+        timings=timings,
     )
-    if no_questionnaire_details and "details" in result:
-        for key in ("questionnaire_posting", "questionnaire_details_sample"):
-            result["details"].pop(key, None)
-    return result
 
 
-@app.post("/stats", response_model=None)
-def api_post_stats(req: StatsRequest) -> Dict[str, Any]:
-    """机构、学校、问卷星综合统计（POST 请求体）"""
-    result = get_stats(
+@app.post("/stats/stream", response_model=None)
+async def api_post_stats_stream(req: StatsStreamRequest) -> StreamingResponse:
+    """综合统计流式输出（POST 请求体）"""
+    return await _stream_stats(
+        req.format,
+        max(1, req.chunk_size),
+        no_questionnaire_details=req.no_questionnaire_details,
         school=req.school,
         major=req.major,
         region=req.region,
@@ -103,35 +441,47 @@ def api_post_stats(req: StatsRequest) -> Dict[str, Any]:
         started_time=req.started_time,
         details_limit=req.details_limit,
         use_cache=req.use_cache,
+        engine=req.engine,
+        timings=req.timings,
     )
-    if req.no_questionnaire_details and "details" in result:
-        for key in ("questionnaire_posting", "questionnaire_details_sample"):
-            result["details"].pop(key, None)
-    return result
+
+
+@app.post("/stats/batch", response_model=None)
+async def api_post_stats_batch(req: StatsBatchRequest) -> Response:
+    """批量综合统计：queries 各项同 /stats 查询参数，结果按顺序返回，共用一次数据加载与全国统计"""
+    return JSONBytesResponse(await get_executor().run(_compute_stats_batch, req))
 
 
 @app.get("/job_demand", response_model=None)
-def api_get_job_demand(
+async def api_get_job_demand(
+    request: Request,
     region: Optional[str] = Query(None, description="区域，如 广东省"),
     details_limit: int = Query(10, ge=0, le=100),
     filter_meaningless_postings: bool = Query(True, description="过滤无意义岗位，默认 True"),
-) -> Dict[str, Any]:
-    """问卷星人才需求提取：岗位及对应的学历、能力、证书要求（对应 questionnaire_main）"""
-    return get_talent_demand(
-        region=region,
-        details_limit=details_limit,
-        filter_meaningless_postings=filter_meaningless_postings,
+    use_cache: bool = Query(True),
+) -> Response:
+    """问卷星人才需求提取：岗位及对应的学历、能力、证书要求（对应 questionnaire_main）；支持 ETag / If-None-Match"""
+    query = {
+        "region": region,
+        "details_limit": details_limit,
+        "filter_meaningless_postings": filter_meaningless_postings,
+        "use_cache": use_cache,
+    }
+    return await _conditional_get(
+        request, _job_demand_key(query), ("questionnaire",), use_cache, _compute_job_demand_body, **query
     )
 
 
 @app.post("/job_demand", response_model=None)
-def api_post_job_demand(req: JobDemandRequest) -> Dict[str, Any]:
+async def api_post_job_demand(req: JobDemandRequest) -> Response:
     """问卷星人才需求提取（POST 请求体）"""
-    return get_talent_demand(
+    return JSONBytesResponse(await get_executor().run(
+        _compute_job_demand_body,
         region=req.region,
         details_limit=req.details_limit,
         filter_meaningless_postings=req.filter_meaningless_postings,
-    )
+        use_cache=req.use_cache,
+    ))
 
 
 def run_server(host: str = "0.0.0.0", port: int = 7806) -> None:
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+学校数据列式快照：将 SCHOOL_DIR 下全部 moe_majors_*.txt 编译为二进制列存
+省份/专业/院校等文本列做字典编码，年份、修业年限存整型数组，文件可 mmap 直接读取
+同时写入预构建的聚合立方体（见 pipeline.cube）
+学校 fingerprint 变化时自动重建
+
+编译: python -m pipeline.snapshot_main
+"""
+
+import fnmatch
+import json
+import mmap
+import os
+import struct
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+from .cache import get_data_fingerprints
+from .config import SCHOOL_DIR, SCHOOL_FILE_PATTERN, SCHOOL_SNAPSHOT
+from .cube import SchoolCube, build_cube, cube_arrays, cube_from_arrays
+from .loader import iter_school_file
+from .major_index import MajorIndex
+
+SNAPSHOT_MAGIC = b"TYSNAP01"
+SNAPSHOT_VERSION = 2
+
+# 字段顺序与文本解析结果一致，物化记录时按此顺序输出
+SCHOOL_FIELDS = ("机构名称", "省份", "学校标识码", "开设专业", "修业年限", "年份", "_source_file")
+# 整型列：规范整数直接存值，其余（空串、缺失、非数字）存为负数下标指向 extras
+INT_FIELDS = ("修业年限", "年份")
+
+_HEADER = struct.Struct("<8sQ")
+_ALIGN = 8
+
+
+class SchoolTable(Sequence):
+    """
+    学校列式表：按行下标物化为与 load_schools 文本解析一致的记录字典
+    rows 为 None 表示整表，否则为行下标子集（按源文件顺序）
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, Sequence[int]],
+        dicts: Dict[str, List[Optional[str]]],
+        sources: List[Tuple[str, int, int]],
+        fingerprint: str = "",
+        rows: Optional[Sequence[int]] = None,
+        buffer: Any = None,
+        cube: Optional[SchoolCube] = None,
+    ) -> None:
+        self.columns = columns
+        self.dicts = dicts
+        self.sources = sources
+        self.fingerprint = fingerprint
+        self.rows = rows
+        self._buffer = buffer  # mmap 引用，随表存活
+        self._distinct: Dict[str, Set[int]] = {}
+        self._cube = cube
+        self._major_index: Optional[MajorIndex] = None
+
+    @property
+    def cube(self) -> SchoolCube:
+        """聚合立方体（快照中已预构建；内存表首次访问时构建）"""
+        if self._cube is None:
+            self._cube = build_cube(self.columns)
+        return self._cube
+
+    @property
+    def major_index(self) -> MajorIndex:
+        """开设专业 倒排索引（基于字典编码，首次访问时构建）"""
+        if self._major_index is None:
+            self._major_index = MajorIndex(self.dicts["开设专业"])
+        return self._major_index
+
+    @property
+    def total(self) -> int:
+        """整表行数（不受 rows 子集影响）"""
+        return len(self.columns[SCHOOL_FIELDS[0]])
+
+    def row_ids(self) -> Sequence[int]:
+        return range(self.total) if self.rows is None else self.rows
+
+    def __len__(self) -> int:
+        return self.total if self.rows is None else len(self.rows)
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        ids = self.row_ids()
+        if isinstance(index, slice):
+            return [self.record(i) for i in ids[index]]
+        return self.record(ids[index])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for i in self.row_ids():
+            yield self.record(i)
+
+    def value(self, field: str, row: int) -> Optional[str]:
+        """取单元格原始字符串值，缺失字段返回 None"""
+        return self.decode(field, self.columns[field][row])
+
+    def decode(self, field: str, code: int) -> Optional[str]:
+        """将列编码还原为原始字符串值"""
+        if field in INT_FIELDS:
+            return str(code) if code >= 0 else self.dicts[field][-code - 1]
+        return self.dicts[field][code]
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """物化单条记录"""
+        rec: Dict[str, Any] = {}
+        for field in SCHOOL_FIELDS:
+            v = self.value(field, row)
+            if v is not None:
+                rec[field] = v
+        return rec
+
+    def records(self, rows: Iterable[int]) -> List[Dict[str, Any]]:
+        return [self.record(i) for i in rows]
+
+    def distinct_codes(self, field: str) -> Set[int]:
+        """列中出现过的编码集合（整型列需扫描一次，结果缓存）"""
+        if field not in INT_FIELDS:
+            return set(range(len(self.dicts[field])))
+        if field not in self._distinct:
+            self._distinct[field] = set(self.columns[field])
+        return self._distinct[field]
+
+    def codes_where(self, field: str, pred: Callable[[Optional[str]], bool]) -> Set[int]:
+        """在去重后的取值上求值谓词，返回满足条件的编码集合"""
+        return {c for c in self.distinct_codes(field) if pred(self.decode(field, c))}
+
+    def scan(self, conditions: Dict[str, Optional[Set[int]]]) -> List[int]:
+        """
+        按列编码集合筛选行，返回满足全部条件的行下标（保持原顺序）
+        conditions: {字段: 允许的编码集合}，None 表示不限
+        """
+        conds = sorted(
+            ((self.columns[f], ok) for f, ok in conditions.items() if ok is not None),
+            key=lambda x: len(x[1]),
+        )
+        if not conds:
+            return list(self.row_ids())
+        col, ok = conds[0]
+        if self.rows is None:
+            ids = [i for i, c in enumerate(col) if c in ok]
+        else:
+            ids = [i for i in self.rows if col[i] in ok]
+        for col, ok in conds[1:]:
+            ids = [i for i in ids if col[i] in ok]
+        return ids
+
+    def select_sources(self, pattern: str) -> "SchoolTable":
+        """按源文件名 glob 模式取子表，等价于对目录 glob 后逐个解析"""
+        matched = [(s, e) for name, s, e in self.sources if fnmatch.fnmatchcase(name, pattern)]
+        if len(matched) == len(self.sources) and self.rows is None:
+            return self
+        rows: List[int] = []
+        for s, e in matched:
+            rows.extend(range(s, e))
+        if self.rows is not None:
+            keep = set(self.rows)
+            rows = [i for i in rows if i in keep]
+        view = SchoolTable(
+            self.columns, self.dicts, self.sources, self.fingerprint, rows, self._buffer, self._cube
+        )
+        view._major_index = self._major_index
+        return view
+
+
+def _encode_int(val: Optional[str], extras: List[Optional[str]], extra_ids: Dict[Optional[str], int]) -> int:
+    if val is not None and val.isdigit() and val.isascii() and str(int(val)) == val and int(val) < 2 ** 31:
+        return int(val)
+    if val not in extra_ids:
+        extra_ids[val] = len(extras)
+        extras.append(val)
+    return -extra_ids[val] - 1
+
+
+class _TableBuilder:
+    """逐条追加记录并做字典/整型编码"""
+
+    def __init__(self) -> None:
+        self.columns: Dict[str, array] = {f: array("i") for f in SCHOOL_FIELDS}
+        self.dicts: Dict[str, List[Optional[str]]] = {f: [] for f in SCHOOL_FIELDS}
+        self.ids: Dict[str, Dict[Optional[str], int]] = {f: {} for f in SCHOOL_FIELDS}
+        self.n = 0
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        for field in SCHOOL_FIELDS:
+            val = rec.get(field)
+            if field in INT_FIELDS:
+                self.columns[field].append(_encode_int(val, self.dicts[field], self.ids[field]))
+                continue
+            code = self.ids[field].get(val)
+            if code is None:
+                code = self.ids[field][val] = len(self.dicts[field])
+                self.dicts[field].append(val)
+            self.columns[field].append(code)
+        self.n += 1
+
+
+def build_table(files: Sequence[Path], fingerprint: str = "", workers: Optional[int] = 1) -> SchoolTable:
+    """
+    逐文件解析并编码为内存列式表
+    workers: 解析进程数，>1 时按省份分块并行（见 pipeline.ingest），None 取 INGEST_WORKERS
+    """
+    if workers != 1:
+        from .ingest import build_table_parallel, resolve_workers
+
+        if resolve_workers(workers) > 1:
+            return build_table_parallel(files, fingerprint, workers)
+    builder = _TableBuilder()
+    sources: List[Tuple[str, int, int]] = []
+    for fp in files:
+        start = builder.n
+        for rec in iter_school_file(fp):
+            builder.add(rec)
+        sources.append((fp.name, start, builder.n))
+    return SchoolTable(builder.columns, builder.dicts, sources, fingerprint)
+
+
+def table_from_records(records: Iterable[Dict[str, Any]]) -> SchoolTable:
+    """将已解析的记录列表编码为列式表（不记录源文件区间）"""
+    builder = _TableBuilder()
+    for rec in records:
+        builder.add(rec)
+    return SchoolTable(builder.columns, builder.dicts, [])
+
+
+# 列式分块：(列编码, 分块字典, 从 0 起的源文件区间)
+TablePart = Tuple[Dict[str, Sequence[int]], Dict[str, List[Optional[str]]], List[Tuple[str, int, int]]]
+
+
+def merge_parts(parts: Iterable[TablePart], fingerprint: str = "") -> SchoolTable:
+    """
+    按顺序拼接若干列式分块为一张表
+    编码按拼接后各取值首次出现的顺序重新分配，结果与对全部文件逐个 build_table 一致
+    """
+    columns: Dict[str, array] = {f: array("i") for f in SCHOOL_FIELDS}
+    dicts: Dict[str, List[Optional[str]]] = {f: [] for f in SCHOOL_FIELDS}
+    ids: Dict[str, Dict[Optional[str], int]] = {f: {} for f in SCHOOL_FIELDS}
+    sources: List[Tuple[str, int, int]] = []
+    offset = 0
+    for cols, local_dicts, local_sources in parts:
+        for f in SCHOOL_FIELDS:
+            col, local = cols[f], local_dicts[f]
+            is_int = f in INT_FIELDS
+            remap: Dict[int, int] = {}
+            # dict.fromkeys 保留块内首次出现顺序
+            for code in dict.fromkeys(col):
+                if is_int and code >= 0:
+                    continue
+                val = local[-code - 1] if is_int else local[code]
+                g = ids[f].get(val)
+                if g is None:
+                    g = ids[f][val] = len(dicts[f])
+                    dicts[f].append(val)
+                remap[code] = -g - 1 if is_int else g
+            if not is_int:
+                columns[f].extend(map(remap.__getitem__, col))
+            elif remap:
+                columns[f].extend(remap.get(v, v) for v in col)
+            else:
+                columns[f].extend(col)
+        n = len(cols[SCHOOL_FIELDS[0]])
+        sources.extend((name, s + offset, e + offset) for name, s, e in local_sources)
+        offset += n
+    return SchoolTable(columns, dicts, sources, fingerprint)
+
+
+def table_parts(items: Iterable[Tuple[SchoolTable, Tuple[str, int, int]]]) -> Iterator[TablePart]:
+    """
+    将 (整表, 源文件区间) 序列切为分块：同一张表中相邻的区间合并为一块
+    列为原表切片，字典直接引用原表，不复制
+    """
+    table: Optional[SchoolTable] = None
+    run: List[Tuple[str, int, int]] = []
+    for t, src in items:
+        if run and (t is not table or run[-1][2] != src[1]):
+            yield _table_part(table, run)
+            run = []
+        table = t
+        run.append(src)
+    if run:
+        yield _table_part(table, run)
+
+
+def _table_part(table: SchoolTable, run: List[Tuple[str, int, int]]) -> TablePart:
+    s0, e1 = run[0][1], run[-1][2]
+    cols = {f: table.columns[f][s0:e1] for f in SCHOOL_FIELDS}
+    return cols, table.dicts, [(name, s - s0, e - s0) for name, s, e in run]
+
+
+def update_table(
+    base: SchoolTable,
+    files: Sequence[Path],
+    changed: Set[str],
+    fingerprint: str = "",
+    workers: Optional[int] = 1,
+) -> SchoolTable:
+    """
+    增量重建：只解析 changed 中的文件（新增或变更），其余文件的行直接取自 base
+    files 为当前全部文件（已排序），不在其中的 base 源文件视为已删除
+    结果与对 files 全量 build_table 一致
+    """
+    base_sources = {name: (name, s, e) for name, s, e in base.sources}
+    fresh_files = [fp for fp in files if fp.name in changed or fp.name not in base_sources]
+    fresh = build_table(fresh_files, workers=workers)
+    fresh_sources = {name: (name, s, e) for name, s, e in fresh.sources}
+    items = (
+        (fresh, fresh_sources[fp.name]) if fp.name in fresh_sources else (base, base_sources[fp.name])
+        for fp in files
+    )
+    return merge_parts(table_parts(items), fingerprint)
+
+
+def write_snapshot(table: SchoolTable, path: Path) -> None:
+    """写入快照文件：定长头 + JSON 元数据 + 8 字节对齐的 int32 列（记录列与聚合立方体）"""
+    blobs = [(f, table.columns[f]) for f in SCHOOL_FIELDS]
+    blobs.extend(cube_arrays(table.cube).items())
+    meta: Dict[str, Any] = {
+        "version": SNAPSHOT_VERSION,
+        "fingerprint": table.fingerprint,
+        "rows": table.total,
+        "itemsize": array("i").itemsize,
+        "fields": list(SCHOOL_FIELDS),
+        "dicts": table.dicts,
+        "sources": table.sources,
+        "offsets": {},
+        "lengths": {name: len(col) for name, col in blobs},
+    }
+    # 列偏移依赖头部长度：迭代至头部长度稳定，不足部分以空格补齐（JSON 允许尾随空白）
+    header = b""
+    while True:
+        offset = _align(_HEADER.size + len(header))
+        offsets = {}
+        for f, col in blobs:
+            offsets[f] = offset
+            offset = _align(offset + len(col) * meta["itemsize"])
+        meta["offsets"] = offsets
+        encoded = json.dumps(meta, ensure_ascii=False).encode("utf-8")
+        if len(encoded) <= len(header):
+            header = encoded.ljust(len(header))
+            break
+        header = encoded
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(SNAPSHOT_MAGIC, len(header)))
+        f.write(header)
+        for fname, col in blobs:
+            f.write(b"\0" * (meta["offsets"][fname] - f.tell()))
+            f.write(_as_array(col).tobytes())
+    os.replace(tmp, path)
+
+
+def open_snapshot(path: Path, fingerprint: Optional[str] = None) -> Optional[SchoolTable]:
+    """
+    以 mmap 打开快照，列直接映射为 memoryview，不复制数据
+    fingerprint 不一致、版本不符或文件损坏时返回 None
+    """
+    if not path.exists():
+        return None
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_len = _HEADER.unpack_from(mm, 0)
+        if magic != SNAPSHOT_MAGIC:
+            mm.close()
+            return None
+        meta = json.loads(bytes(mm[_HEADER.size : _HEADER.size + header_len]).decode("utf-8"))
+        if (
+            meta.get("version") != SNAPSHOT_VERSION
+            or meta.get("itemsize") != array("i").itemsize
+            or meta.get("fields") != list(SCHOOL_FIELDS)
+            or (fingerprint is not None and meta.get("fingerprint") != fingerprint)
+        ):
+            mm.close()
+            return None
+        view = memoryview(mm)
+        itemsize = meta["itemsize"]
+        arrays = {
+            name: view[off : off + meta["lengths"][name] * itemsize].cast("i")
+            for name, off in meta["offsets"].items()
+        }
+        columns = {f: arrays[f] for f in SCHOOL_FIELDS}
+        cube = cube_from_arrays(arrays)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+    sources = [(name, s, e) for name, s, e in meta["sources"]]
+    return SchoolTable(columns, meta["dicts"], sources, meta["fingerprint"], buffer=mm, cube=cube)
+
+
+def compile_snapshot(
+    dir_path: Optional[Path] = None,
+    path: Optional[Path] = None,
+    fingerprint: Optional[str] = None,
+    workers: Optional[int] = None,
+    incremental: bool = True,
+) -> SchoolTable:
+    """
+    编译学校目录为快照并返回映射后的表
+    workers: 解析进程数，None 取 INGEST_WORKERS
+    incremental: 已有快照且文件清单（pipeline.manifest）与之对应时，只重新解析新增或变更的文件，
+        并从区域为变更省份的缓存条目中移除学校段
+    快照写入失败（如目标被占用）时返回内存表，不影响本次查询
+    """
+    from . import manifest
+    from .cache import invalidate_regions
+
+    dir_path = dir_path or SCHOOL_DIR
+    path = path or SCHOOL_SNAPSHOT
+    if fingerprint is None:
+        fingerprint = get_data_fingerprints().get("school", "")
+    files = sorted(dir_path.glob(SCHOOL_FILE_PATTERN))
+    # 先记录文件 fingerprint 再解析：期间被修改的文件下次会按变更重新解析
+    file_fps = manifest.scan_files(files)
+    use_manifest = dir_path == SCHOOL_DIR
+
+    base = open_snapshot(path) if incremental and use_manifest else None
+    known = manifest.load_manifest() if base is not None else None
+    touched: Set[str] = set()
+    if base is not None and known is not None and known.get("fingerprint") == base.fingerprint:
+        changed, removed = manifest.diff_manifest(known, file_fps, base.sources)
+        table = update_table(base, files, changed, fingerprint, workers)
+        touched = manifest.touched_provinces(changed | removed)
+    else:
+        table = build_table(files, fingerprint, workers)
+    try:
+        write_snapshot(table, path)
+        if use_manifest:
+            manifest.save_manifest(fingerprint, file_fps, table.sources)
+    except OSError:
+        return table
+    if touched:
+        invalidate_regions(touched)
+    return open_snapshot(path, fingerprint) or table
+
+
+_lock = threading.Lock()
+_table: Optional[SchoolTable] = None
+
+
+def get_school_table(rebuild: bool = False, workers: Optional[int] = None) -> Optional[SchoolTable]:
+    """
+    获取当前学校列式表（进程内复用）
+    学校 fingerprint 变化时优先读取磁盘快照，不一致则按文件清单增量重建（rebuild=True 时全量）
+    workers: 重建时的解析进程数，None 取 INGEST_WORKERS
+    """
+    global _table
+    fingerprint = get_data_fingerprints().get("school", "")
+    if not fingerprint:
+        return None
+    with _lock:
+        if not rebuild and _table is not None and _table.fingerprint == fingerprint:
+            return _table
+        table = None if rebuild else open_snapshot(SCHOOL_SNAPSHOT, fingerprint)
+        if table is None:
+            table = compile_snapshot(
+                SCHOOL_DIR, SCHOOL_SNAPSHOT, fingerprint, workers=workers, incremental=not rebuild
+            )
+        _table = table
+        return table
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _as_array(col: Sequence[int]) -> array:
+    return col if isinstance(col, array) else array("i", col)
+
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""
+学校数据列式快照编译入口
+用法: python -m pipeline.snapshot_main
+     python -m pipeline.snapshot_main --force
+     python -m pipeline.snapshot_main --force --workers 4
+"""
+
+import argparse
+import sys
+import time
+
+from .config import SCHOOL_DIR, SCHOOL_SNAPSHOT
+from .snapshot import get_school_table
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="编译学校数据列式快照")
+    parser.add_argument("--force", action="store_true", help="忽略已有快照，强制重建")
+    parser.add_argument("--workers", type=int, help="并行解析进程数，默认 INGEST_WORKERS（CPU 核数）")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    table = get_school_table(rebuild=args.force, workers=args.workers)
+    if table is None:
+        print(f"未找到学校数据: {SCHOOL_DIR}", file=sys.stderr)
+        return 1
+    print(
+        f"快照: {SCHOOL_SNAPSHOT}  记录数: {table.total}  文件数: {len(table.sources)}  "
+        f"耗时: {time.perf_counter() - t0:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,22 +3,28 @@
 统计计算：统计数 + 详情，机构与问卷星交叉验证
 """
 
-from typing import Any, Dict, List, Optional
+import fnmatch
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from .filters import (
     filter_institutions,
     filter_questionnaire_by_region,
-    filter_schools,
+    filter_schools_scopes,
+    institution_in_region,
+    school_conditions,
 )
 from .loader import (
     infer_host_type,
     infer_is_puhui,
     infer_service_modes,
+    institution_zoning,
     load_institutions,
     load_questionnaire,
     load_schools,
-    parse_zoning,
 )
+from .sections import SECTIONS, merge_sections
+from .snapshot import SchoolTable
+from .timing import span
 
 
 def _institution_detail(item: Dict[str, Any]) -> Dict[str, Any]:
@@ -103,47 +109,218 @@ def _compute_school_distribution(school_data: List[Dict[str, Any]]) -> Dict[str,
     return dist
 
 
-def _compute_institution_distributions(
-    inst_data: List[Dict[str, Any]],
+def _province_distribution(groups: List[Tuple[int, Optional[str], int]]) -> Dict[str, int]:
+    """
+    由 (首条记录下标, 省份, 记录数) 分组得到省份分布
+    按首次出现顺序插入，与 _compute_school_distribution 逐条累加的结果一致
+    """
+    dist: Dict[str, int] = {}
+    for _, prov, n in sorted(groups, key=lambda g: g[0]):
+        prov = (prov or "").strip()
+        if prov:
+            dist[prov] = dist.get(prov, 0) + n
+    return dist
+
+
+def _school_scope_stats(
+    schools: Sequence[Dict[str, Any]],
+    region: Optional[str],
+    major: Optional[str],
+    started_time: Optional[int],
+    education_level: Optional[str],
+    details_limit: int,
+    national: Optional[Dict[Tuple[Any, ...], Any]] = None,
 ) -> Dict[str, Any]:
     """
-    计算机构分布：城市、举办主体、普惠、服务模式
+    学校区域/全国统计：{scope: {"count", "distribution"}}，region 另含 "details"（前 details_limit 条记录）
+    整表快照直接在聚合立方体上计数，只物化详情记录
+    national: 全国部分记忆表（见 compute_sections）
     """
-    city_dist: Dict[str, Dict[str, int]] = {}
-    host_dist: Dict[str, int] = {}
-    puhui_dist: Dict[str, int] = {}
-    service_dist: Dict[str, int] = {}
+    if isinstance(schools, SchoolTable) and schools.rows is None:
+        return _school_scope_stats_cube(
+            schools, region, major, started_time, education_level, details_limit, national
+        )
 
-    for item in inst_data:
-        # 城市分布
-        prov, city = parse_zoning(item.get("zoning_name") or "")
-        if prov:
-            if prov not in city_dist:
-                city_dist[prov] = {}
-            c = city or prov  # 直辖市或仅省
-            city_dist[prov][c] = city_dist[prov].get(c, 0) + 1
+    schools_region, schools_national = filter_schools_scopes(
+        schools, region, major, started_time, education_level
+    )
+    return {
+        "region": {
+            "count": len(schools_region),
+            "distribution": _compute_school_distribution(schools_region),
+            "details": schools_region[:details_limit],
+        },
+        "national": {
+            "count": len(schools_national),
+            "distribution": _compute_school_distribution(schools_national),
+        },
+    }
+
+
+def _school_scope_stats_cube(
+    table: SchoolTable,
+    region: Optional[str],
+    major: Optional[str],
+    started_time: Optional[int],
+    education_level: Optional[str],
+    details_limit: int,
+    national_memo: Optional[Dict[Tuple[Any, ...], Any]] = None,
+) -> Dict[str, Any]:
+    """_school_scope_stats 的立方体实现，口径同 filter_schools_scopes"""
+    cells, national = _school_national_cells(table, major, started_time, education_level, national_memo)
 
-        # 举办主体
-        h = infer_host_type(item)
-        host_dist[h] = host_dist.get(h, 0) + 1
+    if not region:
+        return {
+            "region": {**national, "details": table.records(table.cube.row_ids(cells)[:details_limit])},
+            "national": national,
+        }
 
-        # 普惠
-        p = infer_is_puhui(item)
-        puhui_dist[p] = puhui_dist.get(p, 0) + 1
+    ids = _school_region_ids(table, cells, region)
+    return {
+        "region": {
+            "count": len(ids),
+            "distribution": _province_distribution([(i, table.value("省份", i), 1) for i in ids]),
+            "details": table.records(ids[:details_limit]),
+        },
+        "national": national,
+    }
 
-        # 服务模式（可多选）
-        modes = infer_service_modes(item)
-        for m in modes:
-            service_dist[m] = service_dist.get(m, 0) + 1
 
+def _school_national_cells(
+    table: SchoolTable,
+    major: Optional[str],
+    started_time: Optional[int],
+    education_level: Optional[str],
+    national_memo: Optional[Dict[Tuple[Any, ...], Any]] = None,
+) -> Tuple[List[int], Dict[str, Any]]:
+    """全国口径的立方体单元与全国统计 (cells, {"count", "distribution"})，按 national_memo 记忆"""
+    cube = table.cube
+    prov_keys = cube.keys["省份"]
+
+    def _national() -> Tuple[List[int], Dict[str, Any]]:
+        cells = cube.cells(school_conditions(table, None, major, started_time, education_level, "national"))
+        by_prov: Dict[int, List[int]] = {}
+        for c in cells:
+            g = by_prov.setdefault(prov_keys[c], [cube.first_row(c), 0])
+            g[0] = min(g[0], cube.first_row(c))
+            g[1] += cube.size(c)
+        return cells, {
+            "count": sum(n for _, n in by_prov.values()),
+            "distribution": _province_distribution(
+                [(first, table.decode("省份", code), n) for code, (first, n) in by_prov.items()]
+            ),
+        }
+
+    return _memoized(national_memo, ("school", major, started_time, education_level), _national)
+
+
+def _school_region_ids(table: SchoolTable, cells: List[int], region: Optional[str]) -> List[int]:
+    """全国口径单元中属于 region 的行号（省份 == region 且来自 moe_majors_{region}_*.txt），按行号顺序"""
+    cube = table.cube
+    if not region:
+        return cube.row_ids(cells)
+    prov_keys = cube.keys["省份"]
+    prov_ok = table.codes_where("省份", lambda v: v == region)
+    pattern = f"moe_majors_{region}_*.txt"
+    src_ok = table.codes_where("_source_file", lambda v: fnmatch.fnmatchcase(v or "", pattern))
+    src = table.columns["_source_file"]
+    return [i for i in cube.row_ids([c for c in cells if prov_keys[c] in prov_ok]) if src[i] in src_ok]
+
+
+def _memoized(memo: Optional[Dict[Tuple[Any, ...], Any]], key: Tuple[Any, ...], build: Callable[[], Any]) -> Any:
+    """memo 为 None 时直接计算，否则按 key 记忆（memo 只需支持 get 与赋值，如 national.NationalView）"""
+    if memo is None:
+        return build()
+    value = memo.get(key)
+    if value is None:
+        value = memo[key] = build()
+    return value
+
+
+def _new_institution_distributions() -> Dict[str, Any]:
     return {
-        "city_distribution": city_dist,
-        "host_type_distribution": host_dist,
-        "puhui_distribution": puhui_dist,
-        "service_mode_distribution": service_dist,
+        "city_distribution": {},
+        "host_type_distribution": {},
+        "puhui_distribution": {},
+        "service_mode_distribution": {},
     }
 
 
+def _add_institution(dists: Dict[str, Any], item: Dict[str, Any], prov: str, city: str) -> None:
+    """将单个机构计入分布（prov/city 为 institution_zoning 结果）"""
+    city_dist: Dict[str, Dict[str, int]] = dists["city_distribution"]
+    host_dist: Dict[str, int] = dists["host_type_distribution"]
+    puhui_dist: Dict[str, int] = dists["puhui_distribution"]
+    service_dist: Dict[str, int] = dists["service_mode_distribution"]
+
+    # 城市分布
+    if prov:
+        if prov not in city_dist:
+            city_dist[prov] = {}
+        c = city or prov  # 直辖市或仅省
+        city_dist[prov][c] = city_dist[prov].get(c, 0) + 1
+
+    # 举办主体
+    h = infer_host_type(item)
+    host_dist[h] = host_dist.get(h, 0) + 1
+
+    # 普惠
+    p = infer_is_puhui(item)
+    puhui_dist[p] = puhui_dist.get(p, 0) + 1
+
+    # 服务模式（可多选）
+    for m in infer_service_modes(item):
+        service_dist[m] = service_dist.get(m, 0) + 1
+
+
+def _compute_institution_distributions(
+    inst_data: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    计算机构分布：城市、举办主体、普惠、服务模式
+    """
+    dists = _new_institution_distributions()
+    for item in inst_data:
+        prov, city = institution_zoning(item)
+        _add_institution(dists, item, prov, city)
+    return dists
+
+
+def _compute_institution_scopes(
+    inst_all: List[Dict[str, Any]],
+    region: Optional[str],
+    dists_national: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+    """
+    单次遍历机构：同时完成区域筛选与区域/全国两套分布
+    返回 (区域机构列表, 区域分布, 全国分布)，结果与分别调用
+    filter_institutions + _compute_institution_distributions 一致
+    dists_national: 已算好的全国分布（如批量查询共用），传入时只累加区域分布
+    """
+    region = region.strip() if region else None
+    add_national = dists_national is None
+    if add_national:
+        dists_national = _new_institution_distributions()
+    if not region:
+        if add_national:
+            for item in inst_all:
+                prov, city = institution_zoning(item)
+                _add_institution(dists_national, item, prov, city)
+        return list(inst_all), dists_national, dists_national
+
+    inst_region: List[Dict[str, Any]] = []
+    dists_region = _new_institution_distributions()
+    for item in inst_all:
+        zoning = item.get("zoning_name") or ""
+        prov, city = institution_zoning(item)
+        if add_national:
+            _add_institution(dists_national, item, prov, city)
+        if institution_in_region(region, zoning, prov, city):
+            inst_region.append(item)
+            _add_institution(dists_region, item, prov, city)
+    return inst_region, dists_region, dists_national
+
+
 def _questionnaire_posting_stats(data: List[Dict[str, Any]]) -> Dict[str, Any]:
     """问卷星岗位/薪酬/证书等聚合统计"""
     posting_cols = ["最缺岗位", "岗位", "紧缺岗位", "需求岗位", "岗位需求"]
@@ -181,91 +358,209 @@ def compute_stats(
     education_level: Optional[str] = None,
     started_time: Optional[int] = None,
     details_limit: int = 50,
+    institutions: Optional[List[Dict[str, Any]]] = None,
+    questionnaire: Optional[List[Dict[str, Any]]] = None,
+    schools: Optional[Sequence[Dict[str, Any]]] = None,
 ) -> Dict[str, Any]:
     """
     计算统计数与详情
+    institutions / questionnaire / schools: 已加载的数据集（如来自 DatasetRegistry），None 时自动加载
     返回：stats (region + national) + details
     """
-    inst_all = load_institutions()
-    questionnaire = load_questionnaire()
+    return merge_sections(
+        compute_sections(
+            SECTIONS, school, major, region, education_level, started_time, details_limit,
+            institutions, questionnaire, schools,
+        )
+    )
 
-    # 机构
-    inst_region = filter_institutions(inst_all, region, "region")
-    inst_national = inst_all
 
-    # 学校：region 时只加载该省文件以加速，national 需加载全部
-    if region:
-        schools_region_raw = filter_schools(
-            load_schools(region_filter=region), region, major, started_time, education_level, "region"
-        )
-        schools_national_raw = filter_schools(
-            load_schools(), None, major, started_time, education_level, "national"
-        )
+def compute_sections(
+    sections: Iterable[str],
+    school: Optional[str] = None,
+    major: Optional[str] = None,
+    region: Optional[str] = None,
+    education_level: Optional[str] = None,
+    started_time: Optional[int] = None,
+    details_limit: int = 50,
+    institutions: Optional[List[Dict[str, Any]]] = None,
+    questionnaire: Optional[List[Dict[str, Any]]] = None,
+    schools: Optional[Sequence[Dict[str, Any]]] = None,
+    national: Optional[Dict[Tuple[Any, ...], Any]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    只计算指定的结果段（见 pipeline.sections），只加载这些段依赖的数据源
+    national: 全国部分记忆表，同一批数据上的多次调用传入同一 dict 时，
+              与区域无关的全国统计（学校部分按专业/年份/学历）只计算一次
+    返回 {段: 段内容}
+    """
+    need = set(sections)
+    out: Dict[str, Dict[str, Any]] = {}
+
+    inst_all: List[Dict[str, Any]] = []
+    inst_region: List[Dict[str, Any]] = []
+    if need & {"institution", "cross"}:
+        inst_all = load_institutions() if institutions is None else institutions
+    if "institution" in need:
+        # 机构：单次遍历得到区域筛选结果及区域/全国分布（城市、举办主体、普惠、服务模式）
+        with span("stats.institution") as s:
+            inst_region, dists_region, dists_national = _compute_institution_scopes(
+                inst_all, region, (national or {}).get(("institution",))
+            )
+            if national is not None:
+                national[("institution",)] = dists_national
+            out["institution"] = institution_section(
+                inst_region, inst_all, dists_region, dists_national, details_limit
+            )
+            s.records = len(inst_region)
+    elif "cross" in need:
+        inst_region = filter_institutions(inst_all, region)
+
+    if need & {"school", "school_national"}:
+        # 学校：只加载一次，单次筛选同时得到区域与全国结果；只缺全国段时按全国查询计算，不物化详情
+        # school_count = 开设某专业的培养点记录数（婴幼儿托育 189 条）
+        schools_all = load_schools() if schools is None else schools
+        scoped = "school" in need
+        with span("stats.school") as s:
+            school_stats = _school_scope_stats(
+                schools_all, region if scoped else None, major, started_time, education_level,
+                details_limit if scoped else 0, national,
+            )
+            out.update({k: v for k, v in school_sections(school_stats).items() if k in need})
+            s.records = school_stats["region"]["count"]
+
+    q_all: List[Dict[str, Any]] = []
+    q_region: List[Dict[str, Any]] = []
+    if need & {"questionnaire", "cross"}:
+        q_all = load_questionnaire() if questionnaire is None else questionnaire
+        q_region = filter_questionnaire_by_region(q_all, region)
+    if "questionnaire" in need:
+        with span("stats.questionnaire", len(q_region)):
+            out["questionnaire"] = questionnaire_section(
+                _questionnaire_posting_stats(q_region),
+                _memoized(national, ("questionnaire",), lambda: _questionnaire_posting_stats(q_all)),
+            )
+
+    if "cross" in need:
+        with span("stats.cross_validate", len(inst_region)):
+            out["cross"] = cross_section(
+                cross_validate_institutions(inst_region, q_region),
+                _memoized(national, ("cross",), lambda: cross_validate_institutions(inst_all, q_all)),
+            )
+    return out
+
+
+# 随 details_limit 变化的列表详情：流式输出时汇总按 details_limit=0 计算，这些详情由 iter_detail_rows 逐块生成
+STREAM_DETAIL_FIELDS = ("institutions", "schools")
+
+
+def iter_detail_rows(
+    region: Optional[str] = None,
+    major: Optional[str] = None,
+    started_time: Optional[int] = None,
+    education_level: Optional[str] = None,
+    details_limit: int = 50,
+    chunk_size: int = 50,
+    institutions: Optional[List[Dict[str, Any]]] = None,
+    schools: Optional[Sequence[Dict[str, Any]]] = None,
+    national: Optional[Dict[Tuple[Any, ...], Any]] = None,
+) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    逐块生成 STREAM_DETAIL_FIELDS 详情 (字段, 行列表)，每块至多 chunk_size 行，
+    按字段拼接后与 compute_sections 的同名详情一致；数据在迭代到该字段时才加载、筛选与物化
+    national: 全国部分记忆表（学校立方体单元取自其中，键同 compute_sections）
+    """
+    chunk_size = max(1, chunk_size)
+    inst_all = load_institutions() if institutions is None else institutions
+    inst_region = filter_institutions(inst_all, (region or "").strip() or None)[:details_limit]
+    for i in range(0, len(inst_region), chunk_size):
+        yield "institutions", [_institution_detail(x) for x in inst_region[i:i + chunk_size]]
+
+    schools_all = load_schools() if schools is None else schools
+    if isinstance(schools_all, SchoolTable) and schools_all.rows is None:
+        cells, _ = _school_national_cells(schools_all, major, started_time, education_level, national)
+        ids = _school_region_ids(schools_all, cells, region)[:details_limit]
+        for i in range(0, len(ids), chunk_size):
+            yield "schools", [_school_detail(x) for x in schools_all.records(ids[i:i + chunk_size])]
     else:
-        schools_all = load_schools()
-        schools_region_raw = filter_schools(
-            schools_all, region, major, started_time, education_level, "region"
-        )
-        schools_national_raw = filter_schools(
-            schools_all, None, major, started_time, education_level, "national"
-        )
-    # school_count = 开设某专业的培养点记录数（婴幼儿托育 189 条）
-    schools_region = schools_region_raw
-    schools_national = schools_national_raw
+        region_rows = filter_schools_scopes(schools_all, region, major, started_time, education_level)[0]
+        region_rows = region_rows[:details_limit]
+        for i in range(0, len(region_rows), chunk_size):
+            yield "schools", [_school_detail(x) for x in region_rows[i:i + chunk_size]]
+
 
-    # 问卷星
-    q_region = filter_questionnaire_by_region(questionnaire, region)
-    q_national = questionnaire
-    posting_region = _questionnaire_posting_stats(q_region)
-    posting_national = _questionnaire_posting_stats(q_national)
+_INFERRED_NOTE = "普惠、服务模式按名称关键词推断，仅供参考"
 
-    # 交叉验证
-    cross_region = cross_validate_institutions(inst_region, q_region)
-    cross_national = cross_validate_institutions(inst_national, q_national)
 
-    # 机构分布统计（城市、举办主体、普惠、服务模式）
-    inst_dists_region = _compute_institution_distributions(inst_region)
-    inst_dists_national = _compute_institution_distributions(inst_national)
+def institution_section(
+    inst_region: Sequence[Dict[str, Any]],
+    inst_national: Sequence[Dict[str, Any]],
+    dists_region: Dict[str, Any],
+    dists_national: Dict[str, Any],
+    details_limit: int,
+) -> Dict[str, Any]:
+    """机构段：数量、分布与区域机构详情"""
+
+    def _scope(items: Sequence[Dict[str, Any]], dists: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "institution_count": len(items),
+            "city_distribution": dists["city_distribution"],
+            "host_type_distribution": dists["host_type_distribution"],
+            "puhui_distribution": dists["puhui_distribution"],
+            "service_mode_distribution": dists["service_mode_distribution"],
+            "_inferred_note": _INFERRED_NOTE,
+        }
+
+    return {
+        "region": _scope(inst_region, dists_region),
+        "national": _scope(inst_national, dists_national),
+        "details": {"institutions": [_institution_detail(x) for x in inst_region[:details_limit]]},
+    }
 
-    # 学校按省份分布
-    school_dist_region = _compute_school_distribution(schools_region)
-    school_dist_national = _compute_school_distribution(schools_national)
 
+def school_sections(school_stats: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """学校段（区域部分与详情）与学校全国段：school_stats 为 _school_scope_stats 结果"""
     return {
-        "stats": {
+        "school": {
             "region": {
-                "institution_count": len(inst_region),
-                "city_distribution": inst_dists_region["city_distribution"],
-                "host_type_distribution": inst_dists_region["host_type_distribution"],
-                "puhui_distribution": inst_dists_region["puhui_distribution"],
-                "service_mode_distribution": inst_dists_region["service_mode_distribution"],
-                "_inferred_note": "普惠、服务模式按名称关键词推断，仅供参考",
-                "school_count": len(schools_region),
-                "school_distribution": school_dist_region,
-                "posting_sample_count": posting_region["sample_count"],
-                "matched_institution_count": cross_region["matched_count"],
+                "school_count": school_stats["region"]["count"],
+                "school_distribution": school_stats["region"]["distribution"],
             },
+            "national": {},
+            "details": {"schools": [_school_detail(x) for x in school_stats["region"]["details"]]},
+        },
+        "school_national": {
+            "region": {},
             "national": {
-                "institution_count": len(inst_national),
-                "city_distribution": inst_dists_national["city_distribution"],
-                "host_type_distribution": inst_dists_national["host_type_distribution"],
-                "puhui_distribution": inst_dists_national["puhui_distribution"],
-                "service_mode_distribution": inst_dists_national["service_mode_distribution"],
-                "_inferred_note": "普惠、服务模式按名称关键词推断，仅供参考",
-                "school_count": len(schools_national),
-                "school_distribution": school_dist_national,
-                "posting_sample_count": posting_national["sample_count"],
-                "matched_institution_count": cross_national["matched_count"],
+                "school_count": school_stats["national"]["count"],
+                "school_distribution": school_stats["national"]["distribution"],
             },
+            "details": {},
         },
+    }
+
+
+def questionnaire_section(posting_region: Dict[str, Any], posting_national: Dict[str, Any]) -> Dict[str, Any]:
+    """问卷星段：posting_* 为 _questionnaire_posting_stats 结果"""
+    return {
+        "region": {"posting_sample_count": posting_region["sample_count"]},
+        "national": {"posting_sample_count": posting_national["sample_count"]},
         "details": {
-            "institutions": [_institution_detail(x) for x in inst_region[:details_limit]],
-            "schools": [_school_detail(x) for x in schools_region[:details_limit]],
             "questionnaire_posting": posting_region.get("posting_distribution", {}),
             "questionnaire_details_sample": posting_region.get("details_sample", []),
+        },
+    }
+
+
+def cross_section(cross_region: Dict[str, Any], cross_national: Dict[str, Any]) -> Dict[str, Any]:
+    """交叉验证段：cross_* 为 cross_validate_institutions 结果"""
+    return {
+        "region": {"matched_institution_count": cross_region["matched_count"]},
+        "national": {"matched_institution_count": cross_national["matched_count"]},
+        "details": {
             "cross_validation": {
                 "region_matched_count": cross_region["matched_count"],
                 "national_matched_count": cross_national["matched_count"],
-            },
+            }
         },
     }
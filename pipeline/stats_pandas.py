@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+pandas 向量化统计引擎：输出与 stats.compute_stats 逐字节一致
+各数据源首次使用时构建一次类型化 DataFrame（省/市/举办主体等为类别列，学校为字典编码列），
+区域/全国筛选用布尔掩码，分布用 factorize + bincount 按首次出现顺序计数
+"""
+
+import fnmatch
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .filters import (
+    QUESTIONNAIRE_REGION_COLUMNS,
+    institution_in_region,
+    questionnaire_region_matcher,
+    school_conditions,
+)
+from .loader import (
+    infer_host_type,
+    infer_is_puhui,
+    infer_service_modes,
+    institution_zoning,
+    load_institutions,
+    load_questionnaire,
+    load_schools,
+)
+from .sections import SECTIONS, merge_sections
+from .snapshot import SchoolTable, table_from_records
+from .stats import (
+    _memoized,
+    _province_distribution,
+    cross_section,
+    cross_validate_institutions,
+    institution_section,
+    questionnaire_section,
+    school_sections,
+)
+from .timing import span
+
+SERVICE_MODES = ("全日托", "半月托", "小时托")
+POSTING_COLUMNS = ["最缺岗位", "岗位", "紧缺岗位", "需求岗位", "岗位需求"]
+
+
+def _require_pandas() -> Tuple[Any, Any]:
+    try:
+        import numpy as np
+        import pandas as pd
+    except ImportError:
+        raise ImportError("pandas 引擎需要: pip install pandas")
+    return np, pd
+
+
+class _FrameCache:
+    """按数据对象身份缓存构建好的 DataFrame（同一数据版本只构建一次）"""
+
+    def __init__(self, build: Callable[[Any], Any]) -> None:
+        self._build = build
+        self._source: Any = None
+        self._frame: Any = None
+        self._lock = threading.Lock()
+
+    def get(self, data: Any) -> Any:
+        with self._lock:
+            if self._source is not data:
+                self._frame = self._build(data)
+                self._source = data
+            return self._frame
+
+
+# --- 机构 ---
+
+def _build_institution_frame(inst: List[Dict[str, Any]]) -> Any:
+    np, pd = _require_pandas()
+    # 区划（区划名, 省, 市）去重编号，区域判断只在去重后的区划上求值
+    zones: Dict[Tuple[str, str, str], int] = {}
+    zone_ids = [
+        zones.setdefault((item.get("zoning_name") or "", *institution_zoning(item)), len(zones))
+        for item in inst
+    ]
+    zone_list = list(zones)
+    modes = [infer_service_modes(item) for item in inst]
+    frame = pd.DataFrame(
+        {
+            "zone": np.array(zone_ids, dtype=np.int64),
+            "prov": pd.Categorical([zone_list[z][1] for z in zone_ids]),
+            # 城市分布键：直辖市或仅省时用省名
+            "city": pd.Categorical([zone_list[z][2] or zone_list[z][1] for z in zone_ids]),
+            "host": pd.Categorical([infer_host_type(item) for item in inst]),
+            "puhui": pd.Categorical([infer_is_puhui(item) for item in inst]),
+        }
+    )
+    for m in SERVICE_MODES:
+        frame[m] = np.array([m in ms for ms in modes], dtype=bool)
+    frame.attrs["zones"] = zone_list
+    return frame
+
+
+_institution_frames = _FrameCache(_build_institution_frame)
+
+
+def _ordered_counts(values: Any) -> List[Tuple[Any, int]]:
+    """按首次出现顺序返回 (取值, 次数)"""
+    np, pd = _require_pandas()
+    codes, uniques = pd.factorize(values, sort=False)
+    counts = np.bincount(codes, minlength=len(uniques)) if len(codes) else []
+    return [(uniques[i], int(counts[i])) for i in range(len(uniques))]
+
+
+def _institution_distributions(frame: Any) -> Dict[str, Any]:
+    """与 stats._compute_institution_distributions 同口径"""
+    np, pd = _require_pandas()
+    city_dist: Dict[str, Dict[str, int]] = {}
+    with_prov = frame[(frame["prov"] != "").to_numpy()]
+    prov_cats, city_cats = frame["prov"].cat.categories, frame["city"].cat.categories
+    # (省, 市) 合成单个整数键后计数
+    pairs = with_prov["prov"].cat.codes.to_numpy(np.int64) * len(city_cats) + with_prov["city"].cat.codes.to_numpy(np.int64)
+    for key, n in _ordered_counts(pairs) if len(pairs) else []:
+        p, c = divmod(int(key), len(city_cats))
+        city_dist.setdefault(str(prov_cats[p]), {})[str(city_cats[c])] = n
+
+    host_dist = {str(k): n for k, n in _ordered_counts(frame["host"].astype(object).to_numpy())}
+    puhui_dist = {str(k): n for k, n in _ordered_counts(frame["puhui"].astype(object).to_numpy())}
+
+    # 服务模式可多选：同一机构内按 全日托、半月托、小时托 顺序计入
+    firsts = []
+    for order, m in enumerate(SERVICE_MODES):
+        flags = frame[m].to_numpy()
+        if flags.any():
+            firsts.append((int(np.argmax(flags)), order, m, int(flags.sum())))
+    service_dist = {m: n for _, _, m, n in sorted(firsts)}
+
+    return {
+        "city_distribution": city_dist,
+        "host_type_distribution": host_dist,
+        "puhui_distribution": puhui_dist,
+        "service_mode_distribution": service_dist,
+    }
+
+
+def _institution_scopes(
+    inst_all: List[Dict[str, Any]],
+    region: Optional[str],
+    national: Optional[Dict[Tuple[Any, ...], Any]] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+    np, _ = _require_pandas()
+    frame = _institution_frames.get(inst_all)
+    dists_national = _memoized(national, ("institution",), lambda: _institution_distributions(frame))
+    region = region.strip() if region else None
+    if not region:
+        return list(inst_all), dists_national, dists_national
+
+    ok = np.array([institution_in_region(region, *zone) for zone in frame.attrs["zones"]], dtype=bool)
+    mask = ok[frame["zone"].to_numpy()] if len(ok) else np.zeros(len(frame), dtype=bool)
+    inst_region = [inst_all[i] for i in np.flatnonzero(mask)]
+    return inst_region, _institution_distributions(frame[mask]), dists_national
+
+
+# --- 学校 ---
+
+def _school_table(schools: Sequence[Dict[str, Any]]) -> SchoolTable:
+    if isinstance(schools, SchoolTable):
+        return schools
+    return table_from_records(schools)
+
+
+def _build_school_frame(schools: Sequence[Dict[str, Any]]) -> Tuple[SchoolTable, Any]:
+    np, pd = _require_pandas()
+    table = _school_table(schools)
+    ids = np.asarray(table.row_ids(), dtype=np.int64)
+    frame = pd.DataFrame(
+        {f: np.frombuffer(table.columns[f], dtype=np.int32)[ids] for f in ("省份", "开设专业", "年份", "修业年限", "_source_file")}
+    )
+    frame["row"] = ids
+    return table, frame
+
+
+_school_frames = _FrameCache(_build_school_frame)
+
+
+def _school_distribution(table: SchoolTable, prov_codes: Any) -> Dict[str, int]:
+    return _province_distribution(
+        [(i, table.decode("省份", int(code)), n) for i, (code, n) in enumerate(_ordered_counts(prov_codes))]
+    )
+
+
+def _school_scopes(
+    schools: Sequence[Dict[str, Any]],
+    region: Optional[str],
+    major: Optional[str],
+    started_time: Optional[int],
+    education_level: Optional[str],
+    details_limit: int,
+    national_memo: Optional[Dict[Tuple[Any, ...], Any]] = None,
+) -> Dict[str, Any]:
+    """与 stats._school_scope_stats 同口径"""
+    np, _ = _require_pandas()
+    table, frame = _school_frames.get(schools)
+
+    def _national() -> Tuple[Any, Dict[str, Any]]:
+        conditions = school_conditions(table, None, major, started_time, education_level, "national")
+        mask = np.ones(len(frame), dtype=bool)
+        for field, ok in conditions.items():
+            if ok is not None:
+                mask &= frame[field].isin(list(ok)).to_numpy()
+        national_frame = frame[mask]
+        return national_frame, {
+            "count": int(mask.sum()),
+            "distribution": _school_distribution(table, national_frame["省份"].to_numpy()),
+        }
+
+    national_frame, national = _memoized(
+        national_memo, ("school", major, started_time, education_level), _national
+    )
+    if not region:
+        rows = national_frame["row"].to_numpy()[:details_limit]
+        return {
+            "region": {**national, "details": table.records(int(i) for i in rows)},
+            "national": national,
+        }
+
+    pattern = f"moe_majors_{region}_*.txt"
+    prov_ok = table.codes_where("省份", lambda v: v == region)
+    src_ok = table.codes_where("_source_file", lambda v: fnmatch.fnmatchcase(v or "", pattern))
+    region_mask = (
+        national_frame["省份"].isin(list(prov_ok)) & national_frame["_source_file"].isin(list(src_ok))
+    ).to_numpy()
+    region_frame = national_frame[region_mask]
+    rows = region_frame["row"].to_numpy()[:details_limit]
+    return {
+        "region": {
+            "count": int(region_mask.sum()),
+            "distribution": _school_distribution(table, region_frame["省份"].to_numpy()),
+            "details": table.records(int(i) for i in rows),
+        },
+        "national": national,
+    }
+
+
+# --- 问卷星 ---
+
+def _build_questionnaire_frame(data: List[Dict[str, Any]]) -> Any:
+    _, pd = _require_pandas()
+    return pd.DataFrame.from_records(data) if data else pd.DataFrame()
+
+
+_questionnaire_frames = _FrameCache(_build_questionnaire_frame)
+
+
+def _questionnaire_region_mask(frame: Any, region: Optional[str]) -> Any:
+    """与 filter_questionnaire_by_region 同口径；无匹配时为全 True"""
+    np, pd = _require_pandas()
+    mask = np.zeros(len(frame), dtype=bool)
+    if not region or not len(frame):
+        return ~mask
+    match = questionnaire_region_matcher(region)
+    for col in QUESTIONNAIRE_REGION_COLUMNS:
+        if col not in frame.columns:
+            continue
+        values = frame[col]
+        present = values.notna().to_numpy()  # 缺失键不参与匹配
+        codes, uniques = pd.factorize(values.astype(object), sort=False)
+        ok = np.array([match(str(v or "")) for v in uniques], dtype=bool)
+        hit = np.zeros(len(frame), dtype=bool)
+        has_code = codes >= 0
+        hit[has_code] = ok[codes[has_code]] if len(ok) else False
+        mask |= hit & present
+    return mask if mask.any() else ~mask
+
+
+def _posting_stats(frame: Any, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """与 stats._questionnaire_posting_stats 同口径"""
+    np, pd = _require_pandas()
+    chosen = pd.Series([None] * len(frame), index=frame.index, dtype=object)
+    unset = np.ones(len(frame), dtype=bool)
+    for c in POSTING_COLUMNS:
+        if c not in frame.columns:
+            continue
+        col = frame[c]
+        truthy = (col.notna() & col.astype(bool)).to_numpy()
+        take = unset & truthy
+        chosen[take] = col[take]
+        unset &= ~take
+    values = chosen[~unset].astype(str).str.strip().to_numpy()
+    posting_dist = {str(k): n for k, n in _ordered_counts(values)} if len(values) else {}
+
+    sample_details = [{k: v for k, v in row.items() if v and str(v).strip()} for row in rows[:50]]
+    return {
+        "posting_distribution": posting_dist,
+        "sample_count": len(rows),
+        "details_sample": sample_details,
+    }
+
+
+def compute_stats_pandas(
+    school: Optional[str] = None,
+    major: Optional[str] = None,
+    region: Optional[str] = None,
+    education_level: Optional[str] = None,
+    started_time: Optional[int] = None,
+    details_limit: int = 50,
+    institutions: Optional[List[Dict[str, Any]]] = None,
+    questionnaire: Optional[List[Dict[str, Any]]] = None,
+    schools: Optional[Sequence[Dict[str, Any]]] = None,
+) -> Dict[str, Any]:
+    """compute_stats 的 pandas 实现，参数与返回结构相同"""
+    return merge_sections(
+        compute_sections_pandas(
+            SECTIONS, school, major, region, education_level, started_time, details_limit,
+            institutions, questionnaire, schools,
+        )
+    )
+
+
+def compute_sections_pandas(
+    sections: Iterable[str],
+    school: Optional[str] = None,
+    major: Optional[str] = None,
+    region: Optional[str] = None,
+    education_level: Optional[str] = None,
+    started_time: Optional[int] = None,
+    details_limit: int = 50,
+    institutions: Optional[List[Dict[str, Any]]] = None,
+    questionnaire: Optional[List[Dict[str, Any]]] = None,
+    schools: Optional[Sequence[Dict[str, Any]]] = None,
+    national: Optional[Dict[Tuple[Any, ...], Any]] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """stats.compute_sections 的 pandas 实现（national 记忆表同 compute_sections）"""
+    np, _ = _require_pandas()
+    need = set(sections)
+    out: Dict[str, Dict[str, Any]] = {}
+
+    inst_all: List[Dict[str, Any]] = []
+    inst_region: List[Dict[str, Any]] = []
+    if need & {"institution", "cross"}:
+        inst_all = load_institutions() if institutions is None else institutions
+        with span("stats.institution") as s:
+            inst_region, dists_region, dists_national = _institution_scopes(inst_all, region, national)
+            if "institution" in need:
+                out["institution"] = institution_section(
+                    inst_region, inst_all, dists_region, dists_national, details_limit
+                )
+            s.records = len(inst_region)
+
+    if need & {"school", "school_national"}:
+        schools_all = load_schools() if schools is None else schools
+        scoped = "school" in need
+        with span("stats.school") as s:
+            school_stats = _school_scopes(
+                schools_all, region if scoped else None, major, started_time, education_level,
+                details_limit if scoped else 0, national,
+            )
+            out.update({k: v for k, v in school_sections(school_stats).items() if k in need})
+            s.records = school_stats["region"]["count"]
+
+    q_all: List[Dict[str, Any]] = []
+    q_region: List[Dict[str, Any]] = []
+    if need & {"questionnaire", "cross"}:
+        q_all = load_questionnaire() if questionnaire is None else questionnaire
+        with span("filter.questionnaire") as s:
+            q_frame = _questionnaire_frames.get(q_all)
+            q_mask = _questionnaire_region_mask(q_frame, region)
+            q_region = q_all if q_mask.all() else [q_all[i] for i in np.flatnonzero(q_mask)]
+            s.records = len(q_region)
+        if "questionnaire" in need:
+            with span("stats.questionnaire", len(q_region)):
+                out["questionnaire"] = questionnaire_section(
+                    _posting_stats(q_frame[q_mask] if len(q_frame) else q_frame, q_region),
+                    _memoized(national, ("questionnaire",), lambda: _posting_stats(q_frame, q_all)),
+                )
+
+    if "cross" in need:
+        with span("stats.cross_validate", len(inst_region)):
+            out["cross"] = cross_section(
+                cross_validate_institutions(inst_region, q_region),
+                _memoized(national, ("cross",), lambda: cross_validate_institutions(inst_all, q_all)),
+            )
+    return out
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+结果存储：SQLite 本地库，一条查询一行
+主键 O(1) 查找，WAL 模式下多进程（多个 uvicorn worker）并发读写安全，
+支持条目数上限的 LRU 淘汰与单条 TTL
+
+条目按 pipeline.codec 二进制编码（msgpack/JSON + zstd/zlib）；条目中的详情行（字典列表）
+按内容哈希单独存入 rows 表，各条目只保存行 id，相同的行在全库只存一份
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import codec
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    expires_at REAL,
+    region TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at);
+CREATE TABLE IF NOT EXISTS rows (
+    id TEXT PRIMARY KEY,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entry_rows (
+    key TEXT NOT NULL,
+    row_id TEXT NOT NULL,
+    PRIMARY KEY (key, row_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entry_rows_row ON entry_rows (row_id);
+"""
+# 旧库补列（CREATE TABLE IF NOT EXISTS 不会修改已有表）
+_MIGRATIONS = (("region", "ALTER TABLE entries ADD COLUMN region TEXT"),)
+_INDEXES = "CREATE INDEX IF NOT EXISTS idx_entries_region ON entries (region);"
+
+# 命中时访问时间的最小刷新间隔（秒），避免每次读都产生一次写
+_TOUCH_INTERVAL = 60.0
+# 每写入多少次检查一次条目数上限
+_EVICT_EVERY = 32
+# 条目中引用详情行的标记：{"$rows": [行 id, ...]} 替换原字典列表
+_ROWS_REF = "$rows"
+# 进程内已解码详情行的缓存上限（行按内容寻址，不会失效）
+_ROW_CACHE_MAX = 20000
+
+
+def _row_id(row: Dict[str, Any]) -> str:
+    s = json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(s.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _pack_rows(value: Any, rows: Dict[str, Dict[str, Any]]) -> Any:
+    """把嵌套结构中的非空字典列表替换为行引用，行内容收集到 rows {id: 行}"""
+    if isinstance(value, dict):
+        return {k: _pack_rows(v, rows) for k, v in value.items()}
+    if isinstance(value, list) and value and all(isinstance(x, dict) for x in value):
+        ids = []
+        for row in value:
+            rid = _row_id(row)
+            rows[rid] = row
+            ids.append(rid)
+        return {_ROWS_REF: ids}
+    return value
+
+
+def _row_refs(value: Any, out: Set[str]) -> None:
+    """收集结构中引用的行 id"""
+    if isinstance(value, dict):
+        if len(value) == 1 and _ROWS_REF in value:
+            out.update(value[_ROWS_REF])
+            return
+        for v in value.values():
+            _row_refs(v, out)
+
+
+def _unpack_rows(value: Any, rows: Dict[str, Dict[str, Any]]) -> Any:
+    """行引用还原为字典列表（每行浅拷贝，调用方修改不影响行缓存）"""
+    if isinstance(value, dict):
+        if len(value) == 1 and _ROWS_REF in value:
+            return [dict(rows[rid]) for rid in value[_ROWS_REF]]
+        return {k: _unpack_rows(v, rows) for k, v in value.items()}
+    return value
+
+
+class ResultStore:
+    """
+    查询结果存储
+    path: SQLite 文件路径
+    max_entries: 条目数上限，超出时按最近访问时间淘汰；None 不限
+    ttl: 默认过期秒数；None 不过期
+    """
+
+    def __init__(self, path: Path, max_entries: Optional[int] = None, ttl: Optional[float] = None) -> None:
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        self._format = codec.resolve_format()
+        self._rows: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._rows_lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        """每线程一个连接（sqlite3 连接不可跨线程共享）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            existing = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            for column, ddl in _MIGRATIONS:
+                if column not in existing:
+                    try:
+                        conn.execute(ddl)
+                    except sqlite3.OperationalError:
+                        pass  # 其他进程已补列
+            conn.executescript(_INDEXES)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取条目，不存在或已过期返回 None"""
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, accessed_at, expires_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, accessed_at, expires_at = row
+        now = time.time()
+        if expires_at is not None and expires_at <= now:
+            conn.execute("DELETE FROM entries WHERE key = ? AND expires_at <= ?", (key, now))
+            return None
+        if now - accessed_at >= _TOUCH_INTERVAL:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        try:
+            entry = codec.decode(value)
+            refs: Set[str] = set()
+            _row_refs(entry, refs)
+            return _unpack_rows(entry, self._load_rows(refs)) if refs else entry
+        except (codec.DecodeError, KeyError):
+            # 损坏、截断或引用缺失的条目按未命中处理并删除，下次重新计算写入
+            self.delete(key)
+            return None
+
+    def _load_rows(self, ids: Set[str]) -> Dict[str, Dict[str, Any]]:
+        """按 id 取详情行：先查进程内缓存，其余一次查询读出；缺行时抛出 KeyError，行损坏时抛出 codec.DecodeError"""
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._rows_lock:
+            for rid in ids:
+                row = self._rows.get(rid)
+                if row is not None:
+                    self._rows.move_to_end(rid)
+                    found[rid] = row
+        missing = [rid for rid in ids if rid not in found]
+        if missing:
+            loaded = {}
+            conn = self._conn()
+            # SQLite 单条语句变量数有上限，分批查询
+            for i in range(0, len(missing), 500):
+                batch = missing[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                for rid, value in conn.execute(f"SELECT id, value FROM rows WHERE id IN ({marks})", batch):
+                    try:
+                        loaded[rid] = codec.decode(value)
+                    except codec.DecodeError:
+                        # 删除损坏的详情行，引用它的条目读取时按缺行未命中并删除
+                        conn.execute("DELETE FROM rows WHERE id = ?", (rid,))
+                        raise
+            if len(loaded) < len(missing):
+                raise KeyError("缓存条目引用的详情行不存在")
+            found.update(loaded)
+            with self._rows_lock:
+                self._rows.update(loaded)
+                while len(self._rows) > _ROW_CACHE_MAX:
+                    self._rows.popitem(last=False)
+        return found
+
+    def put(
+        self, key: str, entry: Dict[str, Any], ttl: Optional[float] = None, region: Optional[str] = None
+    ) -> None:
+        """写入条目（单条 INSERT OR REPLACE，原子提交）；region 用于按区域失效"""
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        rows: Dict[str, Dict[str, Any]] = {}
+        value = codec.encode(_pack_rows(entry, rows), self._format)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            ids = list(rows)
+            existing: Set[str] = set()
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                existing.update(r[0] for r in conn.execute(f"SELECT id FROM rows WHERE id IN ({marks})", batch))
+            conn.executemany(
+                "INSERT OR IGNORE INTO rows (id, value) VALUES (?, ?)",
+                [(rid, codec.encode(rows[rid], self._format)) for rid in ids if rid not in existing],
+            )
+            conn.execute("DELETE FROM entry_rows WHERE key = ?", (key,))
+            conn.executemany("INSERT INTO entry_rows (key, row_id) VALUES (?, ?)", [(key, rid) for rid in ids])
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at, expires_at, region) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, now, now, now + ttl if ttl else None, region),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self.max_entries and self._writes % _EVICT_EVERY == 1:
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        conn.execute("DELETE FROM entry_rows WHERE key = ?", (key,))
+
+    def keys_in_regions(self, regions: Iterable[str]) -> List[Tuple[str, str]]:
+        """region 列属于 regions 的条目 [(key, region), ...]"""
+        regions = list(regions)
+        if not regions:
+            return []
+        marks = ",".join("?" * len(regions))
+        return list(self._conn().execute(f"SELECT key, region FROM entries WHERE region IN ({marks})", regions))
+
+    def delete_regions(self, regions: Iterable[str]) -> int:
+        """删除 region 列属于 regions 的条目，返回删除数"""
+        regions = list(regions)
+        if not regions:
+            return 0
+        marks = ",".join("?" * len(regions))
+        removed = self._conn().execute(f"DELETE FROM entries WHERE region IN ({marks})", regions).rowcount
+        if removed:
+            self.collect_rows()
+        return removed
+
+    def evict(self) -> int:
+        """删除已过期条目，并按最近访问时间淘汰超出上限的条目，返回删除数"""
+        conn = self._conn()
+        removed = conn.execute(
+            "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+        if self.max_entries:
+            (count,) = conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                removed += conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY accessed_at LIMIT ?)",
+                    (excess,),
+                ).rowcount
+        if removed:
+            self.collect_rows()
+        return removed
+
+    def collect_rows(self) -> int:
+        """删除已无条目引用的详情行（及已删除条目的引用记录），返回删除的行数"""
+        conn = self._conn()
+        conn.execute("DELETE FROM entry_rows WHERE key NOT IN (SELECT key FROM entries)")
+        return conn.execute(
+            "DELETE FROM rows WHERE id NOT IN (SELECT row_id FROM entry_rows)"
+        ).rowcount
+
+    def clear(self) -> None:
+        conn = self._conn()
+        conn.execute("DELETE FROM entries")
+        conn.execute("DELETE FROM entry_rows")
+        conn.execute("DELETE FROM rows")
+
+    def __len__(self) -> int:
+        (count,) = self._conn().execute("SELECT COUNT(*) FROM entries").fetchone()
+        return count
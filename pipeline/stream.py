@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+统计结果流式输出：先输出统计汇总（stats + meta），再逐段输出详情，列表详情按 chunk_size 行分块，
+每块单独序列化，消费方拿到汇总即可开始处理，服务端不必一次序列化整个响应
+配合 api.stream_stats 时汇总先行计算并输出，机构、学校详情在其余详情之后边生成边输出
+
+事件（NDJSON 每行一个，SSE 的 event 为 type、data 为整个事件）:
+    {"type": "stats", "stats": {...}, "meta": {...}}
+    {"type": "details", "field": 详情字段, "data": {...}}          非列表详情（如 questionnaire_posting）
+    {"type": "rows", "field": 详情字段, "rows": [...]}             列表详情分块（空列表输出一个空块）
+    {"type": "end", "counts": {列表详情字段: 行数}}
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .jsonenc import dumps
+from .stats import STREAM_DETAIL_FIELDS
+
+DetailRows = Iterator[Tuple[str, List[Dict[str, Any]]]]
+
+FORMATS = ("ndjson", "sse")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+DEFAULT_CHUNK_ROWS = 50
+
+
+def iter_events(
+    result: Dict[str, Any], chunk_size: int = DEFAULT_CHUNK_ROWS, rows: Optional[DetailRows] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    get_stats 结果 -> 事件序列（顺序：stats、各详情字段、end）
+    rows: api.stream_stats 返回的详情行迭代器；给出时 result 中的 STREAM_DETAIL_FIELDS 改由其逐块输出，排在其余详情之后
+    """
+    chunk_size = max(1, chunk_size)
+    yield {"type": "stats", "stats": result.get("stats", {}), "meta": result.get("meta", {})}
+    counts: Dict[str, int] = {}
+    for field, value in (result.get("details") or {}).items():
+        if rows is not None and field in STREAM_DETAIL_FIELDS:
+            continue
+        if not isinstance(value, list):
+            yield {"type": "details", "field": field, "data": value}
+            continue
+        counts[field] = len(value)
+        if not value:
+            yield {"type": "rows", "field": field, "rows": []}
+        for i in range(0, len(value), chunk_size):
+            yield {"type": "rows", "field": field, "rows": value[i:i + chunk_size]}
+    if rows is not None:
+        for field, chunk in rows:
+            counts[field] = counts.get(field, 0) + len(chunk)
+            yield {"type": "rows", "field": field, "rows": chunk}
+        for field in STREAM_DETAIL_FIELDS:
+            if field not in counts:
+                counts[field] = 0
+                yield {"type": "rows", "field": field, "rows": []}
+    yield {"type": "end", "counts": counts}
+
+
+def encode_event(event: Dict[str, Any], fmt: str = "ndjson") -> bytes:
+    """单个事件编码为 NDJSON 行或 SSE 消息"""
+    data = dumps(event)
+    if fmt == "sse":
+        return b"event: " + event["type"].encode("utf-8") + b"\ndata: " + data + b"\n\n"
+    if fmt == "ndjson":
+        return data + b"\n"
+    raise ValueError(f"未知流式格式: {fmt}，可选 {', '.join(FORMATS)}")
+
+
+def iter_encoded(
+    result: Dict[str, Any], fmt: str = "ndjson", chunk_size: int = DEFAULT_CHUNK_ROWS, rows: Optional[DetailRows] = None
+) -> Iterator[bytes]:
+    """get_stats 结果 -> 编码后的字节块序列（rows 同 iter_events）"""
+    for event in iter_events(result, chunk_size, rows):
+        yield encode_event(event, fmt)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+热路径计时：span(阶段) 记录各阶段墙钟耗时与记录数，始终累加到进程级直方图（pipeline_stage_seconds，
+/metrics 以 Prometheus 文本格式输出）；在 collect() 内执行时还逐条收集，供 get_stats(timings=True)
+写入 meta.timings
+
+阶段名:
+    get_stats / fingerprints / cache.get / cache.put / load / compute    api 层
+    load.institutions / load.questionnaire / load.schools               数据加载
+    filter.institutions / filter.schools / filter.questionnaire         筛选
+    stats.institution / stats.school / stats.questionnaire / stats.cross_validate   统计段
+"""
+
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import METRICS_BUCKETS
+
+
+class Span:
+    """一次计时；records 可在 with 块内赋值（如筛选后的记录数）"""
+
+    __slots__ = ("stage", "records", "seconds")
+
+    def __init__(self, stage: str, records: Optional[int] = None) -> None:
+        self.stage = stage
+        self.records = records
+        self.seconds = 0.0
+
+
+class Timings:
+    """单次调用内收集的 span，按开始顺序排列，depth 为嵌套层级"""
+
+    def __init__(self) -> None:
+        self.spans: List[Dict[str, Any]] = []
+        self.depth = 0
+
+    def as_list(self) -> List[Dict[str, Any]]:
+        return [dict(s) for s in self.spans]
+
+
+_current: ContextVar[Optional[Timings]] = ContextVar("pipeline_timings", default=None)
+
+
+class StageMetrics:
+    """各阶段耗时直方图（累计桶，单位秒）与记录数累计，线程安全"""
+
+    def __init__(self, buckets: Sequence[float] = METRICS_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # 阶段 -> [各桶计数（非累计，末位为 +Inf）, 耗时合计, 次数, 记录数合计（从未记录时为 None）]
+        self._stages: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, records: Optional[int] = None) -> None:
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            s = self._stages.get(stage)
+            if s is None:
+                s = self._stages[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0, None]
+            s[0][i] += 1
+            s[1] += seconds
+            s[2] += 1
+            if records is not None:
+                s[3] = (s[3] or 0) + records
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """{阶段: {"count", "sum_seconds", "records", "buckets": [(le, 累计次数), ...]}}，records 可为 None"""
+        with self._lock:
+            stages = {k: (list(v[0]), v[1], v[2], v[3]) for k, v in self._stages.items()}
+        out: Dict[str, Dict[str, Any]] = {}
+        for stage, (counts, total, n, records) in sorted(stages.items()):
+            cumulative, acc = [], 0
+            for le, c in zip((*self.buckets, float("inf")), counts):
+                acc += c
+                cumulative.append((le, acc))
+            out[stage] = {"count": n, "sum_seconds": total, "records": records, "buckets": cumulative}
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+
+_metrics = StageMetrics()
+
+
+def get_stage_metrics() -> StageMetrics:
+    """进程级阶段直方图"""
+    return _metrics
+
+
+@contextmanager
+def span(stage: str, records: Optional[int] = None) -> Iterator[Span]:
+    """计时 with 块：结束时写入直方图，处于 collect() 内时同时记入本次调用的 timings"""
+    s = Span(stage, records)
+    timings = _current.get()
+    entry: Optional[Dict[str, Any]] = None
+    if timings is not None:
+        entry = {"stage": stage, "depth": timings.depth, "ms": 0.0, "records": records}
+        timings.spans.append(entry)
+        timings.depth += 1
+    t0 = time.perf_counter()
+    try:
+        yield s
+    finally:
+        s.seconds = time.perf_counter() - t0
+        _metrics.observe(stage, s.seconds, s.records)
+        if entry is not None:
+            timings.depth -= 1
+            entry["ms"] = round(s.seconds * 1000, 3)
+            entry["records"] = s.records
+
+
+def timed(stage: str, records: Optional[Callable[[Any], int]] = len) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """函数计时装饰器；records 由返回值得到记录数（默认 len，None 不记录）"""
+
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(stage) as s:
+                result = fn(*args, **kwargs)
+                if records is not None:
+                    s.records = records(result)
+                return result
+
+        return wrapper
+
+    return decorate
+
+
+@contextmanager
+def collect() -> Iterator[Timings]:
+    """在当前上下文（线程 / 协程）内收集 span"""
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(gauges: Sequence[Tuple[str, str, str, float]] = ()) -> str:
+    """
+    阶段直方图（及附加指标）-> Prometheus 文本格式
+    gauges: 附加指标 (名称, 类型 gauge/counter, 说明, 值)
+    """
+    lines = [
+        "# HELP pipeline_stage_seconds 各阶段墙钟耗时（秒）",
+        "# TYPE pipeline_stage_seconds histogram",
+    ]
+    stages = _metrics.snapshot()
+    for stage, s in stages.items():
+        label = _label(stage)
+        for le, n in s["buckets"]:
+            lines.append(f'pipeline_stage_seconds_bucket{{stage="{label}",le="{_number(le)}"}} {n}')
+        lines.append(f'pipeline_stage_seconds_sum{{stage="{label}"}} {_number(s["sum_seconds"])}')
+        lines.append(f'pipeline_stage_seconds_count{{stage="{label}"}} {s["count"]}')
+    lines += [
+        "# HELP pipeline_stage_records_total 各阶段处理记录数累计",
+        "# TYPE pipeline_stage_records_total counter",
+    ]
+    for stage, s in stages.items():
+        if s["records"] is not None:
+            lines.append(f'pipeline_stage_records_total{{stage="{_label(stage)}"}} {s["records"]}')
+    for name, kind, help_text, value in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_number(value)}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+缓存预热：数据更新后按已知查询目录（全国 + SCHOOL_DIR 文件名中的省份 + 机构数据中的城市
+× WARM_MAJORS × WARM_EDUCATION_LEVELS）预先计算并缓存 get_stats 与 get_talent_demand，
+首批报告请求直接命中缓存
+
+用法: python -m pipeline.warm
+     python -m pipeline.warm --majors 520802 570101K --workers 4
+     python -m pipeline.warm --no-cities --no-job-demand
+WARM_ON_STARTUP 开启时由 pipeline.server 在后台线程中执行（默认关闭），并按 WARM_WATCH_SECONDS 检查数据更新后重新预热
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from .api import get_stats_batch
+from .cache import get_data_fingerprints
+from .config import (
+    SCHOOL_DIR,
+    SCHOOL_FILE_PATTERN,
+    WARM_DETAILS_LIMIT,
+    WARM_EDUCATION_LEVELS,
+    WARM_JOB_DEMAND_DETAILS_LIMIT,
+    WARM_MAJORS,
+    WARM_WORKERS,
+)
+from .loader import institution_zoning, school_file_province
+from .questionnaire_extract import get_talent_demand
+from .registry import DatasetRegistry, get_registry
+
+
+def _stderr(msg: str) -> None:
+    print(msg, file=sys.stderr, flush=True)
+
+
+def warm_regions(institutions: Sequence[Dict[str, Any]] = (), include_cities: bool = True) -> List[Optional[str]]:
+    """预热区域：None（全国）+ 学校文件名中的省份 + 机构数据中的城市（按首次出现顺序）"""
+    provinces: List[str] = []
+    if SCHOOL_DIR.exists():
+        provinces = sorted({school_file_province(fp.name) for fp in SCHOOL_DIR.glob(SCHOOL_FILE_PATTERN)})
+    regions: List[Optional[str]] = [None, *provinces]
+    if include_cities:
+        seen = set(provinces)
+        for item in institutions:
+            _, city = institution_zoning(item)
+            if city and city not in seen:
+                seen.add(city)
+                regions.append(city)
+    return regions
+
+
+def warm(
+    majors: Sequence[Optional[str]] = WARM_MAJORS,
+    education_levels: Sequence[Optional[str]] = WARM_EDUCATION_LEVELS,
+    include_cities: bool = True,
+    job_demand: bool = True,
+    workers: Optional[int] = WARM_WORKERS,
+    details_limit: int = WARM_DETAILS_LIMIT,
+    registry: Optional[DatasetRegistry] = None,
+    progress: Optional[Callable[[str], None]] = _stderr,
+) -> Dict[str, Any]:
+    """
+    预热缓存，返回汇总：
+        {"regions": 区域数, "stats": {"queries", "from_cache", "seconds"},
+         "job_demand": {"queries", "seconds"}, "seconds": 总耗时}
+    每个区域的 get_stats 查询作为一批（共用数据与全国基线），各区域在线程池中并行
+    progress: 进度输出函数，None 时不输出
+    """
+    report = progress or (lambda msg: None)
+    registry = registry or get_registry()
+    workers = max(1, int(workers or min(4, os.cpu_count() or 1)))
+    t0 = time.perf_counter()
+    data = registry.get()
+    regions = warm_regions(data.institutions, include_cities)
+    report(f"预热 {len(regions)} 个区域 × {len(majors)} 个专业 × {len(education_levels)} 个学历层次，{workers} 线程")
+
+    def _stats_chunk(region: Optional[str]) -> List[Dict[str, Any]]:
+        queries = [
+            {"region": region, "major": m, "education_level": e, "details_limit": details_limit}
+            for m in majors
+            for e in education_levels
+        ]
+        return get_stats_batch(queries, registry=registry)
+
+    def _job_demand(region: Optional[str]) -> None:
+        get_talent_demand(
+            region=region,
+            use_cache=True,
+            details_limit=WARM_JOB_DEMAND_DETAILS_LIMIT,
+            data=data.questionnaire,
+            fingerprint=data.fingerprints.get("questionnaire", ""),
+        )
+
+    summary: Dict[str, Any] = {"regions": len(regions)}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warm") as pool:
+        t1 = time.perf_counter()
+        futures = {pool.submit(_stats_chunk, r): r for r in regions}
+        n_queries = n_cached = 0
+        for done, fut in enumerate(as_completed(futures), 1):
+            results = fut.result()
+            cached = sum(1 for r in results if r["meta"]["from_cache"])
+            n_queries += len(results)
+            n_cached += cached
+            report(
+                f"[stats {done}/{len(regions)}] {futures[fut] or '全国'}：{len(results)} 条，"
+                f"命中缓存 {cached} 条，累计 {time.perf_counter() - t1:.2f}s"
+            )
+        summary["stats"] = {
+            "queries": n_queries,
+            "from_cache": n_cached,
+            "seconds": round(time.perf_counter() - t1, 3),
+        }
+
+        if job_demand:
+            t1 = time.perf_counter()
+            futures = {pool.submit(_job_demand, r): r for r in regions}
+            for done, fut in enumerate(as_completed(futures), 1):
+                fut.result()
+                if done == len(regions) or done % 10 == 0:
+                    report(f"[job_demand {done}/{len(regions)}] 累计 {time.perf_counter() - t1:.2f}s")
+            summary["job_demand"] = {"queries": len(regions), "seconds": round(time.perf_counter() - t1, 3)}
+
+    summary["seconds"] = round(time.perf_counter() - t0, 3)
+    report(f"预热完成，总耗时 {summary['seconds']:.2f}s")
+    return summary
+
+
+class Warmer(threading.Thread):
+    """
+    后台预热线程：启动时预热一次，之后每 interval 秒检查数据源 fingerprint，变化时重新预热
+    interval 为 None 时只预热一次
+    """
+
+    def __init__(self, interval: Optional[float] = None, **warm_kwargs: Any) -> None:
+        super().__init__(name="cache-warmer", daemon=True)
+        self.interval = interval
+        self.warm_kwargs = warm_kwargs
+        self.last_summary: Optional[Dict[str, Any]] = None
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        warmed: Optional[Dict[str, str]] = None
+        while not self._stop_event.is_set():
+            fps = get_data_fingerprints()
+            if fps != warmed:
+                try:
+                    self.last_summary = warm(**self.warm_kwargs)
+                    warmed = fps
+                except Exception as e:  # 预热失败不影响服务，下一轮重试
+                    _stderr(f"缓存预热失败: {e!r}")
+            if self.interval is None:
+                return
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="缓存预热：预先计算各省份/城市的统计与人才需求")
+    parser.add_argument("--majors", nargs="*", help="专业列表，默认 WARM_MAJORS；传 '' 表示不限专业")
+    parser.add_argument("--education-levels", nargs="*", help="学历层次列表，默认 WARM_EDUCATION_LEVELS")
+    parser.add_argument("--no-cities", action="store_true", help="只预热全国与省份，不含城市")
+    parser.add_argument("--no-job-demand", action="store_true", help="不预热人才需求")
+    parser.add_argument("--workers", type=int, help="并行线程数，默认 WARM_WORKERS")
+    parser.add_argument("--details-limit", type=int, default=WARM_DETAILS_LIMIT, help="统计详情条数上限")
+    args = parser.parse_args()
+
+    majors = WARM_MAJORS if args.majors is None else [m or None for m in args.majors]
+    levels = WARM_EDUCATION_LEVELS if args.education_levels is None else [e or None for e in args.education_levels]
+    summary = warm(
+        majors=majors,
+        education_levels=levels,
+        include_cities=not args.no_cities,
+        job_demand=not args.no_job_demand,
+        workers=args.workers,
+        details_limit=args.details_limit,
+    )
+    s = summary["stats"]
+    print(
+        f"区域: {summary['regions']}  统计查询: {s['queries']}（命中缓存 {s['from_cache']}）{s['seconds']:.2f}s  "
+        f"总耗时: {summary['seconds']:.2f}s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())